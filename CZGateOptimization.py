@@ -1,32 +1,222 @@
-from optimizers.bayesian import BayesianOptimizer
-from optimizers.genetic import GeneticOptimizer
-from optimizers.swarm import SwarmOptimizer
-from optimizers.gradient import AdamWL2Optimizer
-from plotters.line import LinePlotter
-from target.test import *
-from target.gate import loss, structure_val, vector_val
-from process import OptimizationProcess
-import os
+import argparse
 
+from functools import partial
+
+import registry
+from evaluators.cache import EvaluationCache
+from process import OptimizationProcess, Stage
+from stopping import WallClock, EvaluationBudget, TargetValue, NoImprovement
+
+
+# Ключ этапа в --pipeline -> (аргумент Stage, тип)
+STAGE_KEYS = {'rounds': ('rounds', int), 'evaluations': ('max_evaluations', int), 'time': ('max_time', float),
+              'top_k': ('top_k', int), 'parallel': ('parallel', int)}
+
+
+def parse_stage(text: str):
+    name, *items = text.split(':')
+    if name not in registry.OPTIMIZERS:
+        raise argparse.ArgumentTypeError(f'unknown optimizer {name!r}, expected one of {sorted(registry.OPTIMIZERS)}')
+    settings = {}
+    for item in items:
+        key, _, value = item.partition('=')
+        if key not in STAGE_KEYS:
+            raise argparse.ArgumentTypeError(f'unknown stage key {key!r}, expected one of {list(STAGE_KEYS)}')
+        argument, kind = STAGE_KEYS[key]
+        settings[argument] = kind(value)
+    if not {'rounds', 'max_evaluations', 'max_time'} & settings.keys():
+        raise argparse.ArgumentTypeError(f'stage {text!r} needs rounds, evaluations or time')
+    return name, settings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Оптимизация импульса CZ гейта')
+    parser.add_argument('--optimizer', default='adam', choices=sorted(registry.OPTIMIZERS))
+    parser.add_argument('--target', default='gate', choices=registry.target_names())
+    parser.add_argument('--plotter', default='line', choices=sorted(registry.PLOTTERS) + ['none'])
+    parser.add_argument('--iterations', type=int, default=10000)
+    parser.add_argument('--max-time', type=float, help='ограничение времени, секунды; для --pipeline - на весь конвейер')
+    parser.add_argument('--max-evaluations', type=int, help='ограничение числа вычислений цели; для --pipeline - на весь конвейер')
+    parser.add_argument('--target-loss', type=float, help='остановиться, когда потери не выше этого значения')
+    parser.add_argument('--patience', type=int, help='остановиться, если за столько раундов нет улучшения')
+    parser.add_argument('--tolerance', type=float, default=1e-3, help='относительное улучшение для --patience')
+    parser.add_argument('--ensemble', action='store_true',
+                        help='робастная потеря гейта по сетке ошибок --ensemble-rabi x --ensemble-detuning x --ensemble-vnn')
+    parser.add_argument('--ensemble-rabi', type=float, nargs='+', default=[-0.005, 0.0, 0.005],
+                        help='относительные ошибки амплитуды Раби')
+    parser.add_argument('--ensemble-detuning', type=float, nargs='+', default=[-1.0, 0.0, 1.0],
+                        help='сдвиги отстройки')
+    parser.add_argument('--ensemble-vnn', type=float, nargs='+', default=[1.0], help='множители Vnn')
+    parser.add_argument('--dimension', type=int, default=10, help='размерность тестовых функций')
+    parser.add_argument('--bounds', type=float, nargs=2, metavar=('LOW', 'HIGH'),
+                        help='одни границы для всех параметров; по умолчанию границы цели или (0, 10)')
+    parser.add_argument('--repair', choices=['clip', 'reflect', 'wrap'],
+                        help='возврат в границы вылетевших координат; по умолчанию свой у каждого оптимизатора')
+    parser.add_argument('--gradient', default='autodiff', choices=['stochastic', 'full', 'autodiff'])
+    parser.add_argument('--directions', type=int, default=1,
+                        help="направлений SPSA за шаг для --gradient stochastic, например по числу --workers")
+    parser.add_argument('--platform', help="устройство JAX, например 'cpu' или 'cuda'")
+    parser.add_argument('--workers', type=int, default=0, help='число процессов для оценки цели, 0 - без пула')
+    parser.add_argument('--cache', help='файл sqlite для кэша вычислений')
+    parser.add_argument('--checkpoint', help='файл контрольных точек')
+    parser.add_argument('--resume', action='store_true', help='продолжить с --checkpoint')
+    parser.add_argument('--islands', nargs='+', choices=sorted(registry.OPTIMIZERS), metavar='OPTIMIZER',
+                        help='запустить острова: по оптимизатору на остров, например swarm genetic adam adam')
+    parser.add_argument('--island-backend', default='thread', choices=['thread', 'process'])
+    parser.add_argument('--migration-interval', type=int, default=20, help='раундов между миграциями, 0 - без миграций')
+    parser.add_argument('--pipeline', nargs='+', type=parse_stage, metavar='OPTIMIZER[:KEY=VALUE...]',
+                        help='этапы конвейера, например swarm:evaluations=20000:top_k=4 adam:time=3600:parallel=4; '
+                             f'ключи: {", ".join(STAGE_KEYS)}')
+    parser.add_argument('--metrics', help='файл JSON для снимков метрик')
+    parser.add_argument('--profile', nargs=3, metavar=('START', 'STOP', 'PATH'),
+                        help='профилировать раунды [START, STOP) в файл PATH')
+    parser.add_argument('--profile-sampling', action='store_true',
+                        help='сэмплирующий профилировщик (collapsed stacks) вместо cProfile')
+    parser.add_argument('--compilation-cache', help='каталог постоянного кэша компиляции JAX')
+    parser.add_argument('--nan-on-solver-error', action='store_true',
+                        help='сбой решателя даёт NaN вместо исключения; нужно, чтобы гейт попал в кэш компиляции')
+    parser.add_argument('--warm-up', type=int, nargs='*', metavar='BATCH',
+                        help='скомпилировать цель заранее; числа - размеры пакетов')
+    args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error('--resume requires --checkpoint')
+    if args.ensemble and args.target != 'gate':
+        parser.error('--ensemble requires --target gate')
+    if args.pipeline and (args.islands or args.resume or args.checkpoint):
+        # Контрольная точка хранит один оптимизатор, номер этапа и семена в неё не попадают
+        parser.error('--pipeline cannot be combined with --islands, --resume or --checkpoint')
+    if args.islands and (args.checkpoint or args.metrics or args.profile or args.workers or args.cache):
+        parser.error('--islands does not support --checkpoint, --metrics, --profile, --workers or --cache')
+    return args
+
+
+def target_factory(args):
+    # Фабрика цели без аргументов; сериализуется pickle, поэтому годится и для процессов пула и островов
+    if not args.ensemble:
+        return partial(registry.target, args.target)
+
+    from target.gate import get_gate_loss, structure_val, RobustnessEnsemble
+    ensemble = RobustnessEnsemble.grid(args.ensemble_rabi, args.ensemble_detuning, args.ensemble_vnn)
+    return partial(get_gate_loss, structure_val, ensemble=ensemble)
+
+
+def optimizer_options(name: str, args, gradient_function) -> dict:
+    # Параметры оптимизатора name из аргументов командной строки
+    options = {'repair_mode': args.repair}
+    if name == 'adam':
+        gradient_type = args.gradient if gradient_function is not None or args.gradient != 'autodiff' else 'stochastic'
+        options.update({'gradient_type': gradient_type, 'gradient_function': gradient_function,
+                        'directions': args.directions})
+    return options
+
+
+def run_islands(args, factory, target, bounds, minimize: bool, plotter, gradient_function):
+    from islands import IslandProcess
+
+    islands = []
+    for name in args.islands:
+        options = optimizer_options(name, args, gradient_function)
+        if args.island_backend == 'process' and 'gradient_function' in options:
+            # В процессе острова градиент берётся у цели, построенной там же
+            options['gradient_function'] = None
+        islands.append((registry.optimizer(name), options))
+
+    process = IslandProcess(target, islands, bounds, minimize, plotter, getattr(target, 'batch', None),
+                            args.island_backend, target_factory=factory,
+                            migration_interval=args.migration_interval)
+    try:
+        process.optimize(args.iterations)
+        print('Лучшее:', process.find_best())
+    finally:
+        process.close()
+
+
+def stopping_rule(args):
+    rules = []
+    if args.max_time is not None:
+        rules.append(WallClock(args.max_time))
+    if args.max_evaluations is not None:
+        rules.append(EvaluationBudget(args.max_evaluations))
+    if args.target_loss is not None:
+        rules.append(TargetValue(args.target_loss))
+    if args.patience is not None:
+        rules.append(NoImprovement(args.patience, args.tolerance))
+    if not rules:
+        return None
+    rule = rules[0]
+    for other in rules[1:]:
+        rule = rule | other
+    return rule
 
 
 if __name__ == '__main__':
-    target = lambda vector: loss(vector, structure_val)
-    #target = vector_rastrigin
+    args = parse_args()
+
+    # До импорта target.gate: EQX_ON_ERROR читается при загрузке equinox
+    if args.compilation_cache:
+        from target.jax_config import enable_compilation_cache
+        enable_compilation_cache(args.compilation_cache, nan_on_solver_error=args.nan_on_solver_error)
+    if args.platform:
+        from target.jax_config import configure_platform
+        configure_platform(args.platform)
+
+    factory = target_factory(args)
+    target = factory()
+    if args.warm_up is not None and hasattr(target, 'warm_up'):
+        print('Компиляция', target.warm_up(args.warm_up))
+    batch_target = getattr(target, 'batch', None)
+    gradient_function = getattr(target, 'value_and_grad', None)
 
-    dimension = len(vector_val)
+    # У потерь гейта размерность задаёт структура параметров
+    dimension = sum(target.structure) if hasattr(target, 'structure') else args.dimension
 
-    bounds = [(0, 10) for _ in range(dimension)]
+    if args.bounds is None and hasattr(target, 'default_bounds'):
+        bounds = target.default_bounds()
+    else:
+        bounds = [tuple(args.bounds or (0, 10)) for _ in range(dimension)]
 
     minimize = True
 
-    optimizer = AdamWL2Optimizer
+    plotter = registry.plotter(args.plotter)
+
+    if args.islands:
+        run_islands(args, factory, target, bounds, minimize, plotter, gradient_function)
+        raise SystemExit
+
+    optimizer = registry.optimizer(args.optimizer)
 
-    plotter = LinePlotter
+    cache = EvaluationCache(path=args.cache, namespace=getattr(target, 'cache_namespace', args.target))
 
-    process = OptimizationProcess(target, optimizer, bounds, minimize, plotter)
+    optimizer_kwargs = {'cache': cache, **optimizer_options(args.optimizer, args, gradient_function)}
 
+    evaluator = None
+    if args.workers:
+        from evaluators.pool import ProcessPoolEvaluator
+        evaluator = ProcessPoolEvaluator(factory, workers=args.workers,
+                                         expected_batch=max(args.warm_up) if args.warm_up else None)
 
+    process = OptimizationProcess(target, optimizer, bounds, minimize, plotter, batch_target, optimizer_kwargs,
+                                  evaluator)
 
-    process.optimize(10000)
+    if args.metrics:
+        process.enable_metrics_dump(args.metrics, interval=60)
+    if args.checkpoint:
+        process.enable_checkpoints(args.checkpoint, interval=300)
+    if args.profile:
+        start_round, stop_round, path = args.profile
+        process.profile(int(start_round), int(stop_round), path, args.profile_sampling)
 
+    try:
+        stopping = stopping_rule(args)
+        if args.pipeline:
+            stages = [Stage(registry.optimizer(name), optimizer_options(name, args, gradient_function), **settings)
+                      for name, settings in args.pipeline]
+            process.run_pipeline(stages, stopping)
+            reason = process.stop_reason
+        elif args.resume:
+            reason = process.resume(args.checkpoint, stopping=stopping)
+        else:
+            reason = process.optimize(args.iterations, stopping)
+        print('Остановка:', reason)
+    finally:
+        process.close()
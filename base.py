@@ -1,30 +1,46 @@
-import dill
 import numpy as np
-import plotly.graph_objects as go
-import plotly.io
-import matplotlib.pyplot as plt
 
 from abc import ABC, abstractmethod
 from typing import Union, List, Callable, Tuple, Optional
 
 import datetime
+import heapq
 import os
+import time
+
+from collections.abc import Sequence
+
+from storage.log import SolutionLog
+from evaluators.cache import EvaluationCache
+from metrics import Metrics
+from space import ParameterSpace, BoundsLike
 
 
 class Solution:
+    __slots__ = ('timestamp', 'vector', 'function_value', 'function_meta_data', 'optimizer_meta_data', 'source')
+
     def __init__(self, vector: List[float], value: float, function_meta_data: dict = None,
-                 optimizer_meta_data: dict = None):
+                 optimizer_meta_data: dict = None, source: Optional[str] = None, timestamp: Optional[float] = None):
 
-        self.created_at = datetime.datetime.now()
+        self.timestamp = time.time() if timestamp is None else timestamp
 
         self.vector = vector
         self.function_value = value
 
-        self.dimension = len(self.vector)
-
         self.function_meta_data = function_meta_data
         self.optimizer_meta_data = optimizer_meta_data
 
+        # Имя оптимизатора, создавшего решение
+        self.source = source
+
+    @property
+    def created_at(self):
+        return datetime.datetime.fromtimestamp(self.timestamp)
+
+    @property
+    def dimension(self):
+        return len(self.vector)
+
     def __eq__(self, other):
         if isinstance(other, Solution):
             if np.array_equal(self.vector, other.vector):
@@ -43,15 +59,177 @@ class Solution:
                 f'Функция: {self.function_meta_data}')
 
 
+class SolutionSequence(Sequence):
+    """Список решений пула, объекты Solution строятся по запросу из строк массивов."""
+
+    def __init__(self, solution_pool: 'SolutionPool'):
+        self.solution_pool = solution_pool
+
+    def __len__(self):
+        return self.solution_pool.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.solution_pool.solution(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.solution_pool.solution(index)
+
+
 class SolutionPool:
-    def __init__(self):
-        self.solutions: List[Solution] = []
+    """Колоночное хранилище решений с поддерживаемыми на лету статистиками.
 
+    Векторы лежат в растущей матрице float64, значения, время создания и
+    номера оптимизаторов - в параллельных массивах. Минимум, максимум,
+    среднее, кривые лучшего значения и куча из top_k_size лучших решений
+    обновляются при каждой вставке, без сортировки истории.
+    """
+
+    def __init__(self, top_k_size: int = 16, minimization: bool = True, capacity: int = 1024):
         self.onNewSolution: Optional[Callable | None] = None
+        # Если задан, получает пакет (vectors, values, source) из add_solutions целиком
+        self.onNewSolutions: Optional[Callable | None] = None
+
+        self.minimization = minimization
+        self.top_k_size = top_k_size
+
+        self.capacity = capacity
+        self.count = 0
+        self.dimension = None
+
+        self._vectors = None
+        self._values = np.empty(capacity)
+        self._timestamps = np.empty(capacity)
+        self._source_ids = np.empty(capacity, dtype=np.int32)
+
+        # Минимум и максимум на момент каждой вставки
+        self._min_history = np.empty(capacity)
+        self._max_history = np.empty(capacity)
+
+        self.source_names: List[str] = []
+        self._source_index = {}
+
+        # Метаданные хранятся только для тех решений, у которых они есть
+        self._meta = {}
+
+        # Среднее и дисперсия - только по числам: NaN (сбой решателя) в них не входят
+        self.finite_count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+        self._min_index = None
+        self._max_index = None
+
+        # Куча (ключ, индекс) из top_k_size лучших: худший из них лежит в вершине
+        self._top_heap = []
+
+        self.log: Optional[SolutionLog] = None
+
+    @property
+    def solutions(self) -> SolutionSequence:
+        return SolutionSequence(self)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None:
+            return np.empty((0, 0))
+        return self._vectors[:self.count]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self.count]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[:self.count]
+
+    @property
+    def source_ids(self) -> np.ndarray:
+        return self._source_ids[:self.count]
+
+    @property
+    def min_history(self) -> np.ndarray:
+        return self._min_history[:self.count]
+
+    @property
+    def max_history(self) -> np.ndarray:
+        return self._max_history[:self.count]
+
+    def source_id(self, source: Optional[str]) -> int:
+        if source is None:
+            return -1
+        if source not in self._source_index:
+            self._source_index[source] = len(self.source_names)
+            self.source_names.append(source)
+        return self._source_index[source]
+
+    def solution(self, index: int) -> Solution:
+        function_meta_data, optimizer_meta_data = self._meta.get(index, (None, None))
+        source_id = self._source_ids[index]
+        source = self.source_names[source_id] if source_id >= 0 else None
+        return Solution(self._vectors[index].copy(), float(self._values[index]), function_meta_data,
+                        optimizer_meta_data, source, float(self._timestamps[index]))
+
+    def reserve(self, rows: int, dimension: int):
+        if self._vectors is None:
+            self.dimension = dimension
+            self._vectors = np.empty((self.capacity, dimension))
+
+        needed = self.count + rows
+        if needed <= self.capacity:
+            return
+
+        capacity = max(needed, 2 * self.capacity)
+        for name in ('_vectors', '_values', '_timestamps', '_source_ids', '_min_history', '_max_history'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def append_rows(self, vectors, values, source: Optional[str] = None, timestamp: Optional[float] = None) -> int:
+        values = np.asarray(values, dtype=float).reshape(-1)
+        timestamps = np.full(len(values), time.time() if timestamp is None else timestamp)
+        source_ids = np.full(len(values), self.source_id(source), dtype=np.int32)
+        return self.append_columns(vectors, values, timestamps, source_ids)
+
+    def append_columns(self, vectors, values, timestamps, source_ids, write_log: bool = True) -> int:
+        values = np.asarray(values, dtype=float).reshape(-1)
+        if len(values) == 0:
+            return self.count
+        vectors = np.asarray(vectors, dtype=float).reshape(len(values), -1)
+
+        self.reserve(len(values), vectors.shape[1])
+
+        start, stop = self.count, self.count + len(values)
+
+        self._vectors[start:stop] = vectors
+        self._values[start:stop] = values
+        self._timestamps[start:stop] = timestamps
+        self._source_ids[start:stop] = source_ids
+
+        self.update_statistics(start, stop)
+        self.count = stop
+
+        if write_log and self.log is not None:
+            self.log.append(self._vectors[start:stop], self._values[start:stop], self._timestamps[start:stop],
+                            self._source_ids[start:stop], self.source_names)
+
+        return start
 
     def add_solution(self, new_solution: Solution):
 
-        self.solutions.append(new_solution)
+        index = self.append_rows([new_solution.vector], [new_solution.function_value], new_solution.source,
+                                 new_solution.timestamp)
+
+        if new_solution.function_meta_data is not None or new_solution.optimizer_meta_data is not None:
+            self._meta[index] = (new_solution.function_meta_data, new_solution.optimizer_meta_data)
+
+        # Своя копия вектора: массив оптимизатора может измениться, а срез буфера пула
+        # держал бы в памяти весь буфер и после его расширения
+        new_solution.vector = self._vectors[index].copy()
 
         if self.onNewSolution is not None:
             self.onNewSolution(new_solution)
@@ -59,50 +237,368 @@ class SolutionPool:
         else:
             return False
 
+    def add_solutions(self, vectors, values, source: Optional[str] = None):
+        start = self.append_rows(vectors, values, source)
+        if start == self.count:
+            return False
+
+        if self.onNewSolutions is not None:
+            self.onNewSolutions(self.vectors[start:], self.values[start:], source)
+            return True
+        elif self.onNewSolution is not None:
+            for index in range(start, self.count):
+                self.onNewSolution(self.solution(index))
+            return True
+        else:
+            return False
+
+    def update_statistics(self, start: int, stop: int):
+        values = self._values[start:stop]
+        finite = ~np.isnan(values)
+        finite_values = values[finite]
+
+        if len(finite_values):
+            # Объединение среднего и дисперсии двух выборок (Chan et al.)
+            previous_count = self.finite_count
+            self.finite_count += len(finite_values)
+            batch_mean = finite_values.mean()
+            delta = batch_mean - self.mean
+            self.mean += delta * len(finite_values) / self.finite_count
+            self._m2 += (np.sum((finite_values - batch_mean) ** 2) +
+                         delta ** 2 * previous_count * len(finite_values) / self.finite_count)
+
+        # fmin/fmax пропускают NaN; до первого числа история остаётся NaN
+        previous_min = self._values[self._min_index] if self._min_index is not None else np.nan
+        previous_max = self._values[self._max_index] if self._max_index is not None else np.nan
+
+        self._min_history[start:stop] = np.fmin(previous_min, np.fmin.accumulate(values))
+        self._max_history[start:stop] = np.fmax(previous_max, np.fmax.accumulate(values))
+
+        if not len(finite_values):
+            return
+
+        # Как у sorted: минимум - первое из равных, максимум - последнее
+        batch_min = int(np.nanargmin(values))
+        if self._min_index is None or values[batch_min] < previous_min:
+            self._min_index = start + batch_min
+        batch_max = len(values) - 1 - int(np.nanargmax(values[::-1]))
+        if self._max_index is None or values[batch_max] >= previous_max:
+            self._max_index = start + batch_max
+
+        if self.top_k_size > 0:
+            # Для минимизации храним -value, чтобы в вершине был худший из лучших
+            keys = -values if self.minimization else values
+            offsets = np.flatnonzero(finite)
+            if len(self._top_heap) == self.top_k_size:
+                offsets = offsets[keys[offsets] > self._top_heap[0][0]]
+            for offset in offsets:
+                item = (keys[offset], start + int(offset))
+                if len(self._top_heap) < self.top_k_size:
+                    heapq.heappush(self._top_heap, item)
+                elif item[0] > self._top_heap[0][0]:
+                    heapq.heapreplace(self._top_heap, item)
+
+    @property
+    def variance(self):
+        if self.finite_count < 2:
+            return 0.0
+        return self._m2 / (self.finite_count - 1)
+
+    @property
+    def best_history(self) -> np.ndarray:
+        return self.min_history if self.minimization else self.max_history
+
+    def best_solution(self):
+        return self.min_solution() if self.minimization else self.max_solution()
+
+    @property
+    def best_value(self) -> Optional[float]:
+        # Без создания Solution: для частых проверок (правила остановки и т.п.)
+        index = self._min_index if self.minimization else self._max_index
+        return None if index is None else float(self._values[index])
+
+    def top_k(self, k: int) -> List[Solution]:
+        if k <= self.top_k_size:
+            items = sorted(self._top_heap, key=lambda item: (-item[0], item[1]))
+            return [self.solution(item[1]) for item in items[:k]]
+
+        # NaN в лучшие не попадают, как и в кучу
+        indices = self.sorted_indices()
+        indices = indices[~np.isnan(self.values[indices])]
+        if not self.minimization:
+            indices = indices[::-1]
+        return [self.solution(index) for index in indices[:k]]
+
+    def attach_log(self, log: SolutionLog, write_existing: bool = True):
+        # Дальнейшие решения пишутся в журнал по мере поступления
+        if write_existing and self.count > 0:
+            log.append(self.vectors, self.values, self.timestamps, self.source_ids, self.source_names)
+        self.log = log
+
+    def close_log(self):
+        if self.log is not None:
+            self.log.close()
+
+    def read_log(self, log: SolutionLog):
+        # Номера источников в журнале переводятся в номера этого пула
+        source_ids = np.array([self.source_id(name) for name in log.source_names] + [-1], dtype=np.int32)
+        for chunk in log.chunks():
+            self.append_columns(chunk['vector'], chunk['value'], chunk['timestamp'], source_ids[chunk['source']],
+                                write_log=False)
+
+    @classmethod
+    def from_log(cls, path: str, resume: bool = False, **kwargs) -> 'SolutionPool':
+        """Восстанавливает пул из журнала; с resume=True продолжает писать в него же."""
+        solution_pool = cls(**kwargs)
+        log = SolutionLog(path)
+        solution_pool.read_log(log)
+        if resume:
+            solution_pool.attach_log(log, write_existing=False)
+        return solution_pool
+
     def save(self, dir_path: str):
         files_num = len(os.listdir(dir_path)) + 1
-        path = dir_path + '/' + str(files_num) + '.pkl'
-        dill.dump(self, path)
+        log = SolutionLog(dir_path + '/' + str(files_num))
+        log.append(self.vectors, self.values, self.timestamps, self.source_ids, self.source_names)
+        log.close()
 
     def load(self, path: str):
-        solution_pool = dill.load(path)
-        for solution in solution_pool:
-            self.add_solution(solution)
+        self.read_log(SolutionLog(path))
 
     def min_solution(self):
-        return self.sorted_solutions()[0]
+        if self._min_index is None:
+            return None
+        return self.solution(self._min_index)
 
     def max_solution(self):
-        return self.sorted_solutions()[-1]
+        if self._max_index is None:
+            return None
+        return self.solution(self._max_index)
+
+    def sorted_indices(self, attr='function_value') -> np.ndarray:
+        column = {'function_value': self.values, 'created_at': self.timestamps, 'timestamp': self.timestamps}[attr]
+        return np.argsort(column, kind='stable')
 
     def sorted_solutions(self, attr='function_value'):
-        return sorted(self.solutions, key=lambda solution: solution.__dict__[attr])
+        return [self.solution(index) for index in self.sorted_indices(attr)]
+
+    def to_arrays(self) -> dict:
+        return {'vectors': self.vectors.copy(), 'values': self.values.copy(), 'timestamps': self.timestamps.copy(),
+                'source_ids': self.source_ids.copy(), 'source_names': np.array(self.source_names, dtype=str)}
+
+    def export_npz(self, path: str):
+        np.savez(path, **self.to_arrays())
+
+
+class SolutionStream:
+    """Пул на стороне оптимизатора: решения сразу уходят слушателю и не хранятся.
+
+    Вся история живёт в пуле процесса; здесь остаются только число решений
+    и лучшее из них (нужно, например, Адаму при приёме мигрантов).
+    """
+
+    def __init__(self, minimization: bool = True):
+        self.onNewSolution: Optional[Callable] = None
+        self.onNewSolutions: Optional[Callable] = None
+
+        self.minimization = minimization
+        self.count = 0
+
+        self.best_value: Optional[float] = None
+        self.best_vector: Optional[np.ndarray] = None
+        self.best_source: Optional[str] = None
+
+    def update_best(self, vectors: np.ndarray, values: np.ndarray, source: Optional[str]):
+        self.count += len(values)
+        if np.isnan(values).all():
+            return
+        index = int(np.nanargmin(values)) if self.minimization else int(np.nanargmax(values))
+        value = float(values[index])
+        if (self.best_value is None or
+                (value < self.best_value if self.minimization else value > self.best_value)):
+            self.best_value = value
+            self.best_vector = np.array(vectors[index], dtype=float)
+            self.best_source = source
+
+    def add_solution(self, new_solution: Solution):
+        self.update_best(np.asarray(new_solution.vector, dtype=float)[None, :],
+                         np.array([new_solution.function_value], dtype=float), new_solution.source)
+
+        if self.onNewSolution is not None:
+            self.onNewSolution(new_solution)
+            return True
+        return False
+
+    def add_solutions(self, vectors, values, source: Optional[str] = None):
+        values = np.asarray(values, dtype=float).reshape(-1)
+        if len(values) == 0:
+            return False
+        vectors = np.asarray(vectors, dtype=float).reshape(len(values), -1)
+        self.update_best(vectors, values, source)
+
+        if self.onNewSolutions is not None:
+            self.onNewSolutions(vectors, values, source)
+            return True
+        elif self.onNewSolution is not None:
+            for vector, value in zip(vectors, values):
+                self.onNewSolution(Solution(vector, float(value), source=source))
+            return True
+        return False
+
+    def best_solution(self) -> Optional[Solution]:
+        if self.best_value is None:
+            return None
+        return Solution(self.best_vector, self.best_value, source=self.best_source)
+
+
+class BaseEvaluator(ABC):
+    # True, если каждый новый размер пакета стоит перекомпиляции (jit/vmap цели);
+    # тогда EvaluationCache дополняет пакет промахов до фиксированных размеров
+    shape_sensitive = False
+
+    @abstractmethod
+    def evaluate(self, vectors) -> np.ndarray:
+        """Значения целевой функции для списка векторов в том же порядке."""
+        pass
+
+    def close(self):
+        pass
+
+
+class SerialEvaluator(BaseEvaluator):
+    def __init__(self, target_function: Callable):
+        self.target_function = target_function
+
+    def evaluate(self, vectors) -> np.ndarray:
+        return np.array([self.target_function(vector) for vector in vectors], dtype=float)
+
+
+class BatchEvaluator(BaseEvaluator):
+    shape_sensitive = True
+
+    def __init__(self, batch_target: Callable):
+        self.batch_target = batch_target
+
+    def evaluate(self, vectors) -> np.ndarray:
+        # Один вызов на всё поколение
+        return np.asarray(self.batch_target(np.asarray(vectors)), dtype=float)
 
 
 class BaseOptimizer(ABC):
-    def __init__(self, target_function: Callable, bounds: List[Tuple[float, float]], minimization: bool = True, *args,
-                 **kwargs):
+    # Как возвращать в границы вылетевшие координаты, см. space.repair
+    repair_mode = 'clip'
+
+    def __init__(self, target_function: Callable, bounds: BoundsLike, minimization: bool = True, *args,
+                 batch_target: Optional[Callable] = None, evaluator: Optional[BaseEvaluator] = None,
+                 cache: Optional[EvaluationCache] = None, metrics: Optional[Metrics] = None,
+                 repair_mode: Optional[str] = None, **kwargs):
         super().__init__()
         self.target_function = target_function
-
-        self.bounds = self.build_bounds(bounds)
+        self.batch_target = batch_target
+
+        if evaluator is None:
+            if batch_target is not None:
+                evaluator = BatchEvaluator(batch_target)
+            else:
+                evaluator = SerialEvaluator(target_function)
+        self.evaluator = evaluator
+
+        # Повторные векторы берутся из кэша, до оценщика доходят только промахи
+        self.cache = cache
+
+        self.metrics = Metrics() if metrics is None else metrics
+        if self.cache is not None:
+            self.metrics.add_source('cache', self.cache.stats)
+        if hasattr(target_function, 'stats'):
+            self.metrics.add_source('target', target_function.stats)
+
+        self.rounds_done = 0
+        self._last_evaluation_end = None
+
+        # Контрольные точки, см. storage.checkpoint.Checkpointer
+        self.checkpointer = None
+        # Вызываются после каждого раунда, например для миграции между островами
+        self.round_callbacks: List[Callable[[], None]] = []
+        # Проверяется после каждого раунда; True - оптимизация прекращается (бюджет этапа и т.п.)
+        self.stop_condition: Optional[Callable[[], bool]] = None
+
+        # Список кортежей, Bound или готовое ParameterSpace; build_bounds переводит
+        # пространство в формат библиотеки оптимизатора
+        self.space = ParameterSpace.from_bounds(bounds, repair_mode or self.repair_mode)
+        self.bounds = self.build_bounds(self.space)
 
         self.minimization = minimization
 
-        self.solution_pool = SolutionPool()
+        self.name = self.__class__.__name__
+
+        # Решения пересылаются в пул процесса без второй копии истории
+        self.solution_pool = SolutionStream(minimization=minimization)
         self.solution_pool.onNewSolution = self.tell_solution
+        self.solution_pool.onNewSolutions = self.tell_solutions
         self.solution_listener = None
 
 
 
     @abstractmethod
-    def build_bounds(self, bounds: List[Tuple[float, float]]):
+    def build_bounds(self, space: ParameterSpace):
         pass
 
     @abstractmethod
     def optimize(self, rounds, *args, **kwargs):
         pass
 
+    def evaluate(self, vectors) -> np.ndarray:
+        start = self.evaluation_started(len(vectors))
+        if self.cache is not None:
+            values = self.cache.evaluate(vectors, self.evaluator)
+        else:
+            values = self.evaluator.evaluate(vectors)
+        self.evaluation_finished(start, len(vectors))
+        return values
+
+    def evaluation_started(self, count: int) -> float:
+        # Время между концом прошлой оценки и началом этой - накладные расходы оптимизатора
+        start = time.perf_counter()
+        if self._last_evaluation_end is not None:
+            self.metrics.observe('optimizer_overhead', start - self._last_evaluation_end, count)
+        return start
+
+    def evaluation_finished(self, start: float, count: int):
+        self._last_evaluation_end = time.perf_counter()
+        self.metrics.observe('target', self._last_evaluation_end - start, count)
+        self.metrics.count('evaluations', count)
+        self.metrics.count('batches')
+
+    def end_round(self) -> bool:
+        # Вызывается оптимизаторами после каждого раунда (итерации, поколения, шага роя);
+        # возвращает True, если пора остановиться
+        self.rounds_done += 1
+        self.metrics.round_finished()
+        if self.checkpointer is not None:
+            self.checkpointer.round_finished()
+        for callback in self.round_callbacks:
+            callback()
+        return self.stop_condition is not None and self.stop_condition()
+
+    def accept_migrants(self, vectors, values):
+        # Лучшие решения других островов; оптимизатор сам решает, как их использовать
+        pass
+
+    def seed(self, vectors, values):
+        # Стартовые точки от предыдущего этапа конвейера, лучшие первыми
+        self.accept_migrants(vectors, values)
+
+    def get_state(self) -> dict:
+        # Наследники дополняют словарь своими массивами; массивы копируются,
+        # потому что запись идёт в фоновом потоке, пока оптимизация продолжается
+        return {'name': self.name, 'rounds_done': self.rounds_done, 'random_state': np.random.get_state()}
+
+    def set_state(self, state: dict):
+        if state['name'] != self.name:
+            raise ValueError(f"checkpoint was written by {state['name']}, not {self.name}")
+        self.rounds_done = state['rounds_done']
+        np.random.set_state(state['random_state'])
+
     def take_solutions(self, solution_pool: SolutionPool):
         for solution in solution_pool.solutions:
             self.solution_pool.add_solution(solution)
@@ -111,11 +607,18 @@ class BaseOptimizer(ABC):
     def tell_solution(self, solution: Solution):
         self.solution_listener.add_solution(solution)
 
+    def tell_solutions(self, vectors, values, source: Optional[str] = None):
+        self.solution_listener.add_solutions(vectors, values, source)
+
     def create_solution(self, vector, f, all_data: bool = False) -> Solution:
         if all_data:
-            return Solution(vector, f, self.create_function__meta_data(), self.create_optimizer_meta_data())
+            return Solution(vector, f, self.create_function__meta_data(), self.create_optimizer_meta_data(),
+                            self.name)
         else:
-            return Solution(vector, f)
+            return Solution(vector, f, source=self.name)
+
+    def add_solutions(self, vectors, values):
+        self.solution_pool.add_solutions(vectors, values, self.name)
 
     def create_function__meta_data(self):
         return {'name': self.target_function.__name__}
@@ -126,6 +629,9 @@ class BaseOptimizer(ABC):
 
 class BasePlotter(ABC):
     def __init__(self):
+        # matplotlib импортируется только когда график действительно нужен
+        import matplotlib.pyplot as plt
+
         self.fig, self.ax = plt.subplots()
 
         plt.ion()
@@ -133,4 +639,9 @@ class BasePlotter(ABC):
 
     @abstractmethod
     def plot_solution_pool(self, solution_pool: SolutionPool, *args, **kwargs):
+        # Вызывается из потока репортёра: только готовит данные, окно не трогает
+        pass
+
+    def redraw(self):
+        # Вызывается из главного потока: GUI-бэкенды (TkAgg, Qt) не терпят вызовов из других потоков
         pass
@@ -0,0 +1,231 @@
+"""Бенчмарк оптимизаторов на тестовых функциях и на потерях гейта.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.run --dimensions 2 8 32 --output results.json
+    python -m benchmarks.run --gate --optimizers AdamWL2Optimizer SwarmOptimizer
+
+Для каждой пары (оптимизатор, функция, размерность) записываются число
+вычислений в секунду, накладные расходы оптимизатора на одно вычисление,
+время и число вычислений до target_value, память. ru_maxrss - пик всего
+процесса, поэтому без --isolate записывается только его прирост за случай
+(rss_peak_growth_mb); с --isolate каждый случай идёт в отдельном процессе
+и max_rss_mb - его собственный пик. Результаты пишутся в JSON, чтобы
+прогоны можно было сравнивать.
+"""
+import numpy as np
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+from process import OptimizationProcess
+from target.test import vector_sum, vector_quadratic_sum, vector_mul, vector_trig, vector_rastrigin
+
+
+# Функция, границы и значение, достижение которого засекается (None - не засекать)
+FUNCTIONS = {
+    'sphere': (vector_quadratic_sum, (-5.0, 5.0), 1e-2),
+    'rastrigin': (vector_rastrigin, (-5.12, 5.12), 1.0),
+    'trig': (vector_trig, (-5.0, 5.0), None),
+    'sum': (vector_sum, (-5.0, 5.0), None),
+    'mul': (vector_mul, (-1.0, 1.0), None),
+}
+
+# Число раундов и параметры оптимизаторов при scale = 1
+OPTIMIZERS = {
+    'AdamWL2Optimizer': ('optimizers.gradient', 500, {}),
+    'SwarmOptimizer': ('optimizers.swarm', 20, {'swarm_size': 200}),
+    'GeneticOptimizer': ('optimizers.genetic', 50, {'sol_per_pop': 40, 'num_parents_mating': 10}),
+    'BayesianOptimizer': ('optimizers.bayesian', 30, {}),
+}
+
+
+class CountingTarget:
+    """Обёртка над целевой функцией: считает вычисления, их время и момент достижения target_value."""
+
+    def __init__(self, function: Callable, target_value: Optional[float] = None):
+        self.function = function
+        self.target_value = target_value
+        self.__name__ = getattr(function, '__name__', 'target')
+
+        self.reset()
+
+    def reset(self):
+        self.evaluations = 0
+        self.target_time = 0.0
+        self.start = time.perf_counter()
+        self.time_to_target = None
+        self.evaluations_to_target = None
+
+    def record(self, values, elapsed: float):
+        self.target_time += elapsed
+        if self.target_value is not None and self.time_to_target is None:
+            reached = np.flatnonzero(np.asarray(values) <= self.target_value)
+            if len(reached):
+                self.time_to_target = time.perf_counter() - self.start
+                self.evaluations_to_target = self.evaluations + int(reached[0]) + 1
+        self.evaluations += len(values)
+
+    def __call__(self, vector) -> float:
+        start = time.perf_counter()
+        value = self.function(vector)
+        self.record([value], time.perf_counter() - start)
+        return value
+
+    def batch(self, matrix) -> np.ndarray:
+        start = time.perf_counter()
+        if hasattr(self.function, 'batch'):
+            values = self.function.batch(matrix)
+        else:
+            values = np.array([self.function(vector) for vector in matrix], dtype=float)
+        self.record(values, time.perf_counter() - start)
+        return values
+
+    def value_and_grad(self, vector):
+        start = time.perf_counter()
+        value, gradient = self.function.value_and_grad(vector)
+        self.record([value], time.perf_counter() - start)
+        return value, gradient
+
+
+def load_optimizer(name: str):
+    module_name = OPTIMIZERS[name][0]
+    module = __import__(module_name, fromlist=[name])
+    return getattr(module, name)
+
+
+def run_case(optimizer_name: str, target: CountingTarget, bounds, rounds: int, optimizer_kwargs: dict,
+             seed: int, trace_memory: bool) -> dict:
+    np.random.seed(seed)
+
+    optimizer = load_optimizer(optimizer_name)
+    optimizer_kwargs = dict(optimizer_kwargs)
+    if optimizer_name == 'AdamWL2Optimizer' and hasattr(target.function, 'value_and_grad'):
+        optimizer_kwargs.update({'gradient_type': 'autodiff', 'gradient_function': target.value_and_grad})
+
+    process = OptimizationProcess(target, optimizer, bounds, True, None, target.batch, optimizer_kwargs, sinks=[])
+
+    rss_before = max_rss_mb()
+    if trace_memory:
+        tracemalloc.start()
+    target.reset()
+    start = time.perf_counter()
+    process.optimize(rounds)
+    wall_time = time.perf_counter() - start
+    peak_traced = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+    process.close()
+
+    evaluations = max(target.evaluations, 1)
+    return {
+        'optimizer': optimizer_name,
+        'rounds': rounds,
+        'seed': seed,
+        'dimension': len(bounds),
+        'evaluations': target.evaluations,
+        'wall_time': wall_time,
+        'target_time': target.target_time,
+        'evaluations_per_second': target.evaluations / wall_time if wall_time > 0 else None,
+        'overhead_per_evaluation': (wall_time - target.target_time) / evaluations,
+        'best_value': process.find_best().function_value if process.solutions_pool.count else None,
+        'target_value': target.target_value,
+        'time_to_target': target.time_to_target,
+        'evaluations_to_target': target.evaluations_to_target,
+        'peak_traced_mb': peak_traced / 2 ** 20 if peak_traced is not None else None,
+        'rss_peak_growth_mb': max_rss_mb() - rss_before,
+        'max_rss_mb': None,
+    }
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_case(function_name: str, dimension: int):
+    # Цель и границы случая; вызывается и в дочернем процессе при --isolate
+    if function_name == 'gate':
+        from target.gate import get_gate_loss, structure_val
+
+        gate_loss = get_gate_loss(structure_val)
+        print('gate warm-up', gate_loss.warm_up())
+        # Те же физические границы, что и у CZGateOptimization.py, а не общий (0, 10)
+        return CountingTarget(gate_loss), gate_loss.default_bounds()
+
+    function, (low, high), target_value = FUNCTIONS[function_name]
+    return CountingTarget(function, target_value), [(low, high)] * dimension
+
+
+def run_isolated(optimizer_name: str, function_name: str, dimension: int, rounds: int, optimizer_kwargs: dict,
+                 seed: int, trace_memory: bool) -> dict:
+    # В свежем процессе ru_maxrss - пик именно этого случая
+    target, bounds = build_case(function_name, dimension)
+    result = run_case(optimizer_name, target, bounds, rounds, optimizer_kwargs, seed, trace_memory)
+    result['max_rss_mb'] = max_rss_mb()
+    return result
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {'time': time.time(), 'commit': commit, 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк оптимизаторов')
+    parser.add_argument('--optimizers', nargs='+', default=list(OPTIMIZERS), choices=list(OPTIMIZERS))
+    parser.add_argument('--functions', nargs='+', default=list(FUNCTIONS), choices=list(FUNCTIONS))
+    parser.add_argument('--dimensions', nargs='+', type=int, default=[2, 8, 32])
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель числа раундов')
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--gate', action='store_true', help='добавить потери CZ гейта')
+    parser.add_argument('--trace-memory', action='store_true', help='пиковая память через tracemalloc (медленнее)')
+    parser.add_argument('--isolate', action='store_true', help='каждый случай в отдельном процессе (честный max_rss_mb)')
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    cases = [(function_name, dimension) for function_name in args.functions for dimension in args.dimensions]
+    if args.gate:
+        # Размерность гейта задаёт его структура
+        cases.append(('gate', None))
+
+    results = []
+    for function_name, dimension in cases:
+        target, bounds = (None, None) if args.isolate else build_case(function_name, dimension)
+        for optimizer_name in args.optimizers:
+            _, rounds, optimizer_kwargs = OPTIMIZERS[optimizer_name]
+            rounds = max(1, int(rounds * args.scale))
+            for seed in range(args.repeats):
+                if args.isolate:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                        result = pool.submit(run_isolated, optimizer_name, function_name, dimension, rounds,
+                                             optimizer_kwargs, seed, args.trace_memory).result()
+                else:
+                    result = run_case(optimizer_name, target, bounds, rounds, optimizer_kwargs, seed,
+                                      args.trace_memory)
+                result['function'] = function_name
+                results.append(result)
+                print(f"{optimizer_name:18} {function_name:10} d={result['dimension']:<3} "
+                      f"{result['evaluations_per_second']:12.1f} eval/s  "
+                      f"overhead {1e6 * result['overhead_per_evaluation']:9.1f} us/eval  "
+                      f"best {result['best_value']:.4g}")
+
+    with open(args.output, 'w') as file:
+        json.dump({'environment': environment(), 'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import numpy as np
+
+import sqlite3
+import threading
+
+from collections import OrderedDict
+from typing import Optional
+
+
+class EvaluationCache:
+    """Мемоизация значений целевой функции с вытеснением по LRU.
+
+    Ключ - байты вектора, по желанию округлённого до сетки quantum. В памяти
+    держится не больше max_size значений. Если задан path, значения ещё и
+    пишутся в sqlite-базу, так что повторные эксперименты с той же
+    конфигурацией (namespace) переиспользуют прошлые расчёты.
+
+    Для оценщиков с shape_sensitive (jit-цель под vmap) пакет промахов
+    дополняется повторами до ближайшей степени двойки, но не больше исходного
+    пакета: иначе каждое новое число промахов стоило бы перекомпиляции.
+    pad_misses=False отключает дополнение.
+    """
+
+    def __init__(self, max_size: int = 100000, quantum: Optional[float] = None, path: Optional[str] = None,
+                 namespace: str = '', pad_misses: bool = True):
+        self.max_size = max_size
+        self.quantum = quantum
+        self.namespace = namespace
+        self.pad_misses = pad_misses
+
+        self.entries = OrderedDict()
+        # Кэш может быть общим для копий оптимизатора в потоках (parallel-этапы конвейера)
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.store_hits = 0
+        self.evictions = 0
+
+        self.store = None
+        if path is not None:
+            self.store = sqlite3.connect(path, check_same_thread=False)
+            self.store.execute('CREATE TABLE IF NOT EXISTS evaluations '
+                               '(namespace TEXT, key BLOB, value REAL, PRIMARY KEY (namespace, key))')
+
+    def key(self, vector) -> bytes:
+        # + 0.0 превращает -0.0 в 0.0, чтобы они давали один ключ
+        vector = np.asarray(vector, dtype=float) + 0.0
+        if self.quantum is not None:
+            return np.round(vector / self.quantum).astype(np.int64).tobytes()
+        return vector.tobytes()
+
+    def get(self, key: bytes) -> Optional[float]:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        if self.store is not None:
+            row = self.store.execute('SELECT value FROM evaluations WHERE namespace = ? AND key = ?',
+                                     (self.namespace, key)).fetchone()
+            if row is not None:
+                # sqlite хранит NaN как NULL; сбой решателя детерминирован, поэтому NaN тоже кэшируется
+                value = float('nan') if row[0] is None else row[0]
+                self.store_hits += 1
+                self.remember(key, value)
+                return value
+
+        return None
+
+    def remember(self, key: bytes, value: float):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def evaluate(self, vectors, evaluator) -> np.ndarray:
+        values = np.empty(len(vectors))
+
+        # Одинаковые векторы внутри пакета считаются один раз
+        missing = OrderedDict()
+        with self.lock:
+            for index, vector in enumerate(vectors):
+                key = self.key(vector)
+                value = self.get(key) if key not in missing else None
+                if value is None:
+                    missing.setdefault(key, []).append(index)
+                else:
+                    values[index] = value
+
+            self.misses += len(missing)
+            self.hits += len(vectors) - len(missing)
+
+        if missing:
+            # Цель считается без блокировки, чтобы потоки не ждали друг друга
+            asks = [vectors[indices[0]] for indices in missing.values()]
+            size = self.padded_size(len(asks), len(vectors), evaluator)
+            computed = evaluator.evaluate(asks + [asks[-1]] * (size - len(asks)))[:len(asks)]
+            for indices, value in zip(missing.values(), computed):
+                values[indices] = value
+
+            with self.lock:
+                for key, value in zip(missing.keys(), computed):
+                    self.remember(key, float(value))
+
+                if self.store is not None:
+                    self.store.executemany('INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?)',
+                                           [(self.namespace, key, float(value))
+                                            for key, value in zip(missing.keys(), computed)])
+                    self.store.commit()
+
+        return values
+
+    def padded_size(self, count: int, batch_size: int, evaluator) -> int:
+        if not (self.pad_misses and getattr(evaluator, 'shape_sensitive', False)) or count == batch_size:
+            return count
+        return min(1 << (count - 1).bit_length(), batch_size)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'store_hits': self.store_hits,
+                'evictions': self.evictions, 'size': len(self.entries),
+                'hit_rate': self.hits / total if total else 0.0}
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
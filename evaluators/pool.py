@@ -0,0 +1,92 @@
+import numpy as np
+import multiprocessing
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Optional
+
+from base import BaseEvaluator
+
+# Целевая функция рабочего процесса, создаётся один раз в _init_worker
+_worker_target = None
+
+
+def _init_worker(target_factory: Callable[[], Callable], batch_sizes=()):
+    global _worker_target
+    _worker_target = target_factory()
+
+    # Компиляция под размеры кусков до первой задачи, чтобы процесс стартовал горячим
+    if batch_sizes and hasattr(_worker_target, 'warm_up'):
+        start = time.perf_counter()
+        _worker_target.warm_up(batch_sizes, single=False, gradient=False)
+        print(f'worker {os.getpid()}: warm-up {time.perf_counter() - start:.1f} s')
+
+
+def _evaluate_chunk(vectors):
+    # Если цель умеет считать пакетом (например, GateLoss), считаем кусок одним вызовом
+    if hasattr(_worker_target, 'batch'):
+        return np.asarray(_worker_target.batch(np.asarray(vectors)), dtype=float)
+    return np.array([_worker_target(vector) for vector in vectors], dtype=float)
+
+
+def split_chunks(vectors, chunks: int):
+    indices = np.array_split(np.arange(len(vectors)), min(chunks, len(vectors)))
+    return [[vectors[i] for i in chunk] for chunk in indices]
+
+
+def chunk_sizes(batch_size: int, chunks: int):
+    # Размеры кусков, на которые split_chunks делит пакет из batch_size векторов
+    return sorted({len(chunk) for chunk in np.array_split(np.arange(batch_size), min(chunks, batch_size))})
+
+
+class ThreadPoolEvaluator(BaseEvaluator):
+    def __init__(self, target_function: Callable, workers: Optional[int] = None):
+        self.target_function = target_function
+        self.workers = workers or os.cpu_count()
+
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def evaluate(self, vectors) -> np.ndarray:
+        return np.array(list(self.executor.map(self.target_function, vectors)), dtype=float)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class ProcessPoolEvaluator(BaseEvaluator):
+    """Пул процессов, каждый из которых один раз строит свою целевую функцию.
+
+    target_factory должен сериализоваться pickle, например
+    functools.partial(get_gate_loss, structure): тогда потери гейта
+    компилируются в каждом процессе один раз, а не на каждую задачу.
+    Если известен размер пакета expected_batch, процессы при старте заранее
+    компилируют цель под размеры своих кусков (нужен метод warm_up у цели).
+    """
+
+    # Куски считаются пакетно (GateLoss.batch), размер пакета задаёт размеры кусков
+    shape_sensitive = True
+
+    def __init__(self, target_factory: Callable[[], Callable], workers: Optional[int] = None,
+                 chunks_per_worker: int = 1, expected_batch: Optional[int] = None):
+        self.target_factory = target_factory
+        self.workers = workers or os.cpu_count()
+        self.chunks_per_worker = chunks_per_worker
+
+        batch_sizes = ()
+        if expected_batch:
+            batch_sizes = chunk_sizes(expected_batch, self.workers * self.chunks_per_worker)
+
+        # spawn, а не fork: JAX не переживает fork уже инициализированного процесса
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=(target_factory, batch_sizes))
+
+    def evaluate(self, vectors) -> np.ndarray:
+        if len(vectors) == 0:
+            return np.zeros(0)
+        chunks = split_chunks(vectors, self.workers * self.chunks_per_worker)
+        return np.concatenate(list(self.executor.map(_evaluate_chunk, chunks)))
+
+    def close(self):
+        self.executor.shutdown()
@@ -0,0 +1,268 @@
+import numpy as np
+
+import multiprocessing
+import queue
+import threading
+import traceback
+
+from typing import Callable, List, Optional, Tuple, Type
+
+from base import Solution, SolutionPool, BaseOptimizer, BasePlotter
+from space import BoundsLike
+from metrics import Metrics
+from reporter import Reporter
+
+
+class LockedListener:
+    """Слушатель оптимизатора, добавляющий решения в общий пул под блокировкой."""
+
+    def __init__(self, solution_pool: SolutionPool, lock: threading.Lock):
+        self.solution_pool = solution_pool
+        self.lock = lock
+
+    def add_solution(self, solution: Solution):
+        with self.lock:
+            self.solution_pool.add_solution(solution)
+
+    def add_solutions(self, vectors, values, source: Optional[str] = None):
+        with self.lock:
+            self.solution_pool.add_solutions(vectors, values, source)
+
+
+class BufferListener:
+    """Слушатель оптимизатора в процессе острова: копит решения раунда до отправки."""
+
+    def __init__(self):
+        self.vectors = []
+        self.values = []
+
+    def add_solution(self, solution: Solution):
+        self.vectors.append(np.asarray(solution.vector, dtype=float)[None, :])
+        self.values.append(np.array([solution.function_value], dtype=float))
+
+    def add_solutions(self, vectors, values, source: Optional[str] = None):
+        self.vectors.append(np.asarray(vectors, dtype=float))
+        self.values.append(np.asarray(values, dtype=float))
+
+    def take(self):
+        if not self.values:
+            return None, None
+        vectors, values = np.concatenate(self.vectors), np.concatenate(self.values)
+        self.vectors, self.values = [], []
+        return vectors, values
+
+
+def run_in_threads(optimizers: List[BaseOptimizer], rounds: int, on_wait: Optional[Callable[[], None]] = None,
+                   wait_interval: float = 0.1):
+    # Каждый оптимизатор в своём потоке; первая ошибка поднимается после завершения всех.
+    # Пока потоки работают, вызывающий поток раз в wait_interval секунд выполняет on_wait
+    errors = []
+
+    def run(optimizer: BaseOptimizer):
+        try:
+            optimizer.optimize(rounds)
+        except BaseException as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run, args=(optimizer,), name=optimizer.name, daemon=True)
+               for optimizer in optimizers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(wait_interval)
+            if on_wait is not None:
+                on_wait()
+
+    if errors:
+        raise errors[0]
+
+
+def _run_island(index: int, optimizer_class: Type[BaseOptimizer], optimizer_kwargs: dict,
+                target_factory: Callable[[], Callable], bounds, minimization: bool, rounds: int,
+                migration_interval: int, seed: int, results, inbox):
+    # Точка входа процесса острова: решения уходят в results раз в раунд,
+    # мигранты приходят в inbox в ответ на запрос
+    try:
+        np.random.seed(seed)
+
+        target = target_factory()
+        if optimizer_kwargs.get('gradient_type') == 'autodiff' and optimizer_kwargs.get('gradient_function') is None:
+            # Функции JAX не сериализуются; градиент берётся у цели этого процесса
+            optimizer_kwargs = dict(optimizer_kwargs, gradient_function=getattr(target, 'value_and_grad', None))
+        optimizer = optimizer_class(target, bounds, minimization, batch_target=getattr(target, 'batch', None),
+                                    **optimizer_kwargs)
+        optimizer.name = f'{optimizer.name}-{index}'
+
+        buffer = BufferListener()
+        optimizer.solution_listener = buffer
+
+        def round_finished():
+            vectors, values = buffer.take()
+            if values is not None:
+                results.put(('solutions', index, vectors, values))
+            if migration_interval and optimizer.rounds_done % migration_interval == 0:
+                results.put(('migrate', index, None, None))
+                vectors, values = inbox.get()
+                if len(values):
+                    optimizer.accept_migrants(vectors, values)
+
+        optimizer.round_callbacks.append(round_finished)
+        optimizer.optimize(rounds)
+
+        vectors, values = buffer.take()
+        if values is not None:
+            results.put(('solutions', index, vectors, values))
+        results.put(('done', index, None, None))
+    except BaseException:
+        results.put(('error', index, traceback.format_exc(), None))
+
+
+class IslandProcess:
+    """Несколько оптимизаторов (островов), работающих одновременно на один общий пул.
+
+    islands - список пар (класс оптимизатора, его kwargs), например рой, ГА
+    и несколько перезапусков Адама. Раз в migration_interval раундов остров
+    получает migration_size лучших решений общего пула, найденных другими
+    островами, и передаёт их в accept_migrants.
+
+    backend='thread' запускает острова потоками одного процесса (JAX и numpy
+    отпускают GIL во время вычислений). backend='process' запускает каждый
+    остров в отдельном процессе; целевая функция строится там через
+    target_factory, который должен сериализоваться pickle, например
+    functools.partial(get_gate_loss, structure).
+    """
+
+    def __init__(self, target_function: Optional[Callable], islands: List[Tuple[Type[BaseOptimizer], dict]],
+                 bounds: BoundsLike, minimization: bool = True,
+                 plotter: Type[BasePlotter] = None, batch_target: Callable = None, backend: str = 'thread',
+                 target_factory: Optional[Callable[[], Callable]] = None, migration_interval: int = 10,
+                 migration_size: int = 4, sinks: list = None, summary_interval: float = 1.0):
+        if backend not in ('thread', 'process'):
+            raise ValueError(f"unknown backend {backend!r}")
+        if backend == 'process' and target_factory is None:
+            raise ValueError("backend='process' requires target_factory")
+
+        self.target_function = target_function
+        self.batch_target = batch_target
+        self.target_factory = target_factory
+        self.islands = [(optimizer, dict(kwargs or {})) for optimizer, kwargs in islands]
+        self.bounds = bounds
+        self.minimization = minimization
+        self.backend = backend
+        self.migration_interval = migration_interval
+        self.migration_size = migration_size
+
+        self.solutions_pool = SolutionPool(minimization=minimization)
+        self.solutions_pool.onNewSolution = self.new_solution_callback
+        self.solutions_pool.onNewSolutions = self.new_solutions_callback
+        self.lock = threading.Lock()
+
+        self.metrics = Metrics()
+
+        self.optimizers: List[BaseOptimizer] = []
+        if backend == 'thread':
+            for index, (optimizer, kwargs) in enumerate(self.islands):
+                self.optimizers.append(self.create_optimizer(index, optimizer, kwargs))
+
+        self.plotter = plotter() if plotter else None
+        self.reporter = Reporter(self.solutions_pool, self.plotter, sinks, summary_interval, metrics=self.metrics)
+
+    def create_optimizer(self, index: int, optimizer: Type[BaseOptimizer], kwargs: dict) -> BaseOptimizer:
+        optimizer = optimizer(self.target_function, self.bounds, self.minimization, batch_target=self.batch_target,
+                              **kwargs)
+        optimizer.name = f'{optimizer.name}-{index}'
+        optimizer.solution_listener = LockedListener(self.solutions_pool, self.lock)
+
+        def round_finished():
+            if self.migration_interval and optimizer.rounds_done % self.migration_interval == 0:
+                vectors, values = self.migrants(optimizer.name)
+                if len(values):
+                    optimizer.accept_migrants(vectors, values)
+
+        optimizer.round_callbacks.append(round_finished)
+        return optimizer
+
+    def new_solution_callback(self, solution: Solution):
+        self.reporter.submit(solution)
+
+    def new_solutions_callback(self, vectors, values, source=None):
+        self.reporter.submit(self.solutions_pool.solution(self.solutions_pool.count - 1))
+
+    def migrants(self, name: str):
+        # Лучшие решения общего пула, найденные не этим островом
+        with self.lock:
+            best = [solution for solution in self.solutions_pool.top_k(self.solutions_pool.top_k_size)
+                    if solution.source != name][:self.migration_size]
+        self.metrics.count('migrants', len(best))
+        if not best:
+            return np.zeros((0, len(self.bounds))), np.zeros(0)
+        return np.array([solution.vector for solution in best]), np.array([solution.function_value for solution in best])
+
+    def find_best(self):
+        return self.solutions_pool.best_solution()
+
+    def optimize(self, rounds: int):
+        """Каждый остров выполняет rounds своих раундов."""
+        self.reporter.start()
+        try:
+            if self.backend == 'thread':
+                self.optimize_threads(rounds)
+            else:
+                self.optimize_processes(rounds)
+        finally:
+            self.reporter.stop()
+
+    def optimize_threads(self, rounds: int):
+        run_in_threads(self.optimizers, rounds, on_wait=self.reporter.redraw)
+
+    def optimize_processes(self, rounds: int):
+        # spawn, а не fork: JAX не переживает fork уже инициализированного процесса
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        inboxes = [context.Queue() for _ in self.islands]
+        seeds = np.random.randint(0, 2 ** 31 - 1, len(self.islands))
+
+        workers = [context.Process(target=_run_island, name=f'island-{index}',
+                                   args=(index, optimizer, kwargs, self.target_factory, self.bounds,
+                                         self.minimization, rounds, self.migration_interval, int(seeds[index]),
+                                         results, inboxes[index]))
+                   for index, (optimizer, kwargs) in enumerate(self.islands)]
+        names = {}
+        for worker in workers:
+            worker.start()
+
+        try:
+            running = len(workers)
+            while running:
+                self.reporter.redraw()
+                try:
+                    kind, index, first, second = results.get(timeout=0.1)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        raise RuntimeError('island processes exited without finishing')
+                    continue
+
+                if kind == 'solutions':
+                    name = names.setdefault(index, f'{self.islands[index][0].__name__}-{index}')
+                    with self.lock:
+                        self.solutions_pool.add_solutions(first, second, name)
+                elif kind == 'migrate':
+                    inboxes[index].put(self.migrants(names.get(index)))
+                elif kind == 'done':
+                    running -= 1
+                elif kind == 'error':
+                    raise RuntimeError(f'island {index} failed:\n{first}')
+        finally:
+            for worker in workers:
+                if worker.is_alive() and running:
+                    worker.terminate()
+                worker.join()
+
+    def close(self):
+        self.reporter.close()
+        self.metrics.close()
+        for optimizer in self.optimizers:
+            optimizer.evaluator.close()
+            if optimizer.cache is not None:
+                optimizer.cache.close()
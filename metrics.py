@@ -0,0 +1,169 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик: раз в interval секунд снимает стеки всех потоков.
+
+    Оценка может идти не в потоке, запустившем профилирование (острова,
+    parallel-этапы, пул потоков), поэтому снимаются все потоки, кроме самого
+    профилировщика; первым кадром стека идёт имя потока. Результат
+    сохраняется в формате collapsed stacks ("поток;f1;f2;f3 число"), который
+    понимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread_names = {}
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='sampling-profiler', daemon=True)
+
+    def enable(self):
+        self.thread.start()
+
+    def disable(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                stack.append(self.thread_name(thread_id))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def thread_name(self, thread_id: int) -> str:
+        if thread_id not in self.thread_names:
+            # Имена обновляются только при встрече нового потока
+            self.thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        return self.thread_names.get(thread_id, f'thread-{thread_id}')
+
+    def dump_stats(self, path: str):
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+
+class Metrics:
+    """Счётчики и таймеры горячего пути оптимизации.
+
+    Таймер копит число событий, суммарное и максимальное время одного события.
+    snapshot() собирает всё в словарь вместе с внешними источниками
+    (статистика кэша, времена компиляции JAX и т.п.). По желанию снимок
+    периодически пишется в JSON, а на окно раундов подключается профилировщик.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self.counters = defaultdict(int)
+        # имя -> [число событий, суммарное время, максимум на событие]
+        self.timers = defaultdict(lambda: [0, 0.0, 0.0])
+        self.sources = {}
+
+        self.created_at = time.time()
+        self.rounds = 0
+
+        self.dump_path: Optional[str] = None
+        self.dump_interval = 60.0
+        self.last_dump = time.monotonic()
+
+        self.profile_window = None
+        self.profiler = None
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def observe(self, name: str, seconds: float, events: int = 1):
+        with self.lock:
+            timer = self.timers[name]
+            timer[0] += events
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds / max(events, 1))
+
+    @contextmanager
+    def timed(self, name: str, events: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, events)
+
+    def add_source(self, name: str, source: Callable[[], dict]):
+        self.sources[name] = source
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            counters = dict(self.counters)
+            timers = {name: {'count': count, 'total': total, 'mean': total / count if count else 0.0, 'max': peak}
+                      for name, (count, total, peak) in self.timers.items()}
+        return {'time': time.time(), 'uptime': time.time() - self.created_at, 'rounds': self.rounds,
+                'counters': counters, 'timers': timers,
+                'sources': {name: source() for name, source in self.sources.items()}}
+
+    def enable_dump(self, path: str, interval: float = 60.0):
+        self.dump_path = path
+        self.dump_interval = interval
+
+    def dump(self):
+        temporary_path = self.dump_path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(self.snapshot(), file, indent=2, default=float)
+        os.replace(temporary_path, self.dump_path)
+        self.last_dump = time.monotonic()
+
+    def profile(self, start_round: int, stop_round: int, path: str, sampling: bool = False,
+                interval: float = 0.001):
+        """Профилирует раунды с номерами [start_round, stop_round) и пишет результат в path."""
+        self.profile_window = (start_round, stop_round, path, sampling, interval)
+        if self.rounds >= start_round:
+            self.start_profiler()
+
+    def start_profiler(self):
+        _, _, _, sampling, interval = self.profile_window
+        self.profiler = SamplingProfiler(interval) if sampling else cProfile.Profile()
+        self.profiler.enable()
+
+    def stop_profiler(self):
+        self.profiler.disable()
+        self.profiler.dump_stats(self.profile_window[2])
+        self.profiler = None
+        self.profile_window = None
+
+    def round_finished(self):
+        self.rounds += 1
+        self.count('rounds')
+
+        if self.profile_window is not None:
+            start_round, stop_round = self.profile_window[:2]
+            if self.profiler is None and self.rounds == start_round:
+                self.start_profiler()
+            elif self.profiler is not None and self.rounds >= stop_round:
+                self.stop_profiler()
+
+        if self.dump_path is not None and time.monotonic() - self.last_dump >= self.dump_interval:
+            self.dump()
+
+    def close(self):
+        if self.profiler is not None:
+            self.stop_profiler()
+        if self.dump_path is not None:
+            self.dump()
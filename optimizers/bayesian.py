@@ -1,36 +1,141 @@
+import numpy as np
+
+import pickle
+
 from skopt.space import Real
 from skopt import Optimizer
+from skopt.acquisition import gaussian_ei, gaussian_lcb, gaussian_pi
 
-from typing import Callable, Tuple, List
+from typing import Callable, Tuple, List, Optional
 
 from base import BaseOptimizer, Solution, SolutionPool
+from space import ParameterSpace, BoundsLike
 
 
 class BayesianOptimizer(BaseOptimizer):
-    def __init__(self, target_function: Callable, bounds: List[Tuple[float, float]],
-                 minimization: bool = True, *args, **kwargs):
+    """Байесовская оптимизация на skopt с пакетными запросами.
+
+    За раунд запрашивается batch_size точек (стратегия constant liar), они
+    оцениваются одним вызовом evaluate и сообщаются модели вместе. Модель
+    переобучается раз в refit_every раундов; в промежуточных раундах точки
+    выбираются по функции приобретения последней обученной модели.
+    history_window ограничивает историю модели: остаются лучшая четверть
+    окна и самые свежие точки; окно обрезается только в раундах переобучения.
+    Переход к единичному кубу (в том числе логарифмический) делает сам skopt.
+    """
+
+    def __init__(self, target_function: Callable, bounds: BoundsLike,
+                 minimization: bool = True, *args, batch_size: int = 1, strategy: str = 'cl_min',
+                 refit_every: int = 1, history_window: Optional[int] = None, **kwargs):
         super().__init__(target_function, bounds, minimization, *args, **kwargs)
-        self.oracle = Optimizer(self.bounds)
 
-    def build_bounds(self, bounds: List[Tuple[float, float]]):
-        return [Real(bound[0], bound[1]) for bound in bounds]
+        self.batch_size = batch_size
+        self.strategy = strategy
+        self.refit_every = refit_every
+        self.history_window = history_window
+
+        self.model_is_fresh = True
+
+        self.oracle = self.make_oracle()
 
-    def train(self, vector, function_value):
+    def make_oracle(self):
+        # Нужна только последняя модель (ask_from_model), старые не копятся в памяти и контрольных точках
+        return Optimizer(self.bounds, model_queue_size=1)
+
+    def build_bounds(self, space: ParameterSpace):
+        return [Real(bound.low, bound.high, prior='log-uniform' if bound.scale == 'log' else 'uniform',
+                     transform='normalize', name=bound.name) for bound in space.bounds]
+
+    def train(self, vectors, function_values, fit: bool = True):
         if self.minimization:
-            self.oracle.tell(vector, function_value)
+            self.oracle.tell(vectors, list(function_values), fit=fit)
+        else:
+            self.oracle.tell(vectors, list(-1 * np.asarray(function_values)), fit=fit)
+
+    def ask(self):
+        if not self.model_is_fresh:
+            return self.ask_from_model()
+        if self.batch_size == 1:
+            return [self.oracle.ask()]
+        return self.oracle.ask(n_points=self.batch_size, strategy=self.strategy)
+
+    def ask_from_model(self):
+        # Без переобучения: лучшие по приобретению случайные кандидаты для последней модели
+        oracle = self.oracle
+        if not oracle.models:
+            # Модели ещё нет (начальные случайные точки skopt)
+            return oracle.space.rvs(n_samples=self.batch_size, random_state=oracle.rng)
+
+        candidates = oracle.space.rvs(n_samples=oracle.n_points, random_state=oracle.rng)
+        points = oracle.space.transform(candidates)
+        model = oracle.models[-1]
+        kwargs = oracle.acq_func_kwargs or {}
+
+        # Меньше - лучше; gp_hedge выбирает функцию на шаге обучения, здесь для него берётся EI
+        if oracle.acq_func == 'LCB':
+            scores = gaussian_lcb(points, model, kappa=kwargs.get('kappa', 1.96))
+        elif oracle.acq_func == 'PI':
+            scores = -gaussian_pi(points, model, y_opt=np.min(oracle.yi), xi=kwargs.get('xi', 0.01))
         else:
-            self.oracle.tell(vector, -1 * function_value)
+            scores = -gaussian_ei(points, model, y_opt=np.min(oracle.yi), xi=kwargs.get('xi', 0.01))
+        return [candidates[i] for i in np.argsort(scores)[:self.batch_size]]
+
+    def needs_trim(self, extra: int = 0) -> bool:
+        return self.history_window is not None and len(self.oracle.yi) + extra > self.history_window
+
+    def trim_history(self):
+        if not self.needs_trim():
+            return
+
+        values = np.asarray(self.oracle.yi)
+
+        best_count = self.history_window // 4
+        best = np.argsort(values)[:best_count]
+        recent = np.arange(len(values) - (self.history_window - best_count), len(values))
+        keep = np.union1d(best, recent)
+
+        points = [self.oracle.Xi[i] for i in keep]
+
+        # Новая модель обучается один раз на всём окне
+        self.oracle = self.make_oracle()
+        self.oracle.tell(points, list(values[keep]))
+        self.model_is_fresh = True
+
+    def accept_migrants(self, vectors, values):
+        # Чужие точки дополняют историю модели, переобучение - по обычному расписанию
+        self.train([list(vector) for vector in vectors], values, fit=False)
+
+    def get_state(self) -> dict:
+        state = super().get_state()
+        # Без random_state skopt берёт глобальный генератор numpy; после
+        # загрузки модель должна снова делить его с остальным кодом
+        state.update({'oracle': pickle.dumps(self.oracle, protocol=pickle.HIGHEST_PROTOCOL),
+                      'global_rng': self.oracle.rng is np.random.mtrand._rand,
+                      'model_is_fresh': self.model_is_fresh})
+        return state
+
+    def set_state(self, state: dict):
+        super().set_state(state)
+        self.oracle = pickle.loads(state['oracle'])
+        if state['global_rng']:
+            self.oracle.rng = np.random.mtrand._rand
+        self.model_is_fresh = state['model_is_fresh']
 
     def optimize(self, rounds: int, *args, **kwargs):
         for i in range(rounds):
-            ask = self.oracle.ask()
+            asks = [list(ask) for ask in self.ask()]
 
-            f = self.target_function(ask)
+            values = self.evaluate(asks)
 
-            self.train(ask, function_value=f)
+            self.model_is_fresh = (self.rounds_done + 1) % self.refit_every == 0
 
-            solution = self.create_solution(ask, f)
+            # Если окно будет обрезано, модель обучится один раз уже на обрезанной истории
+            self.train(asks, values, fit=self.model_is_fresh and not self.needs_trim(len(asks)))
 
-            self.solution_pool.add_solution(solution)
+            if self.model_is_fresh:
+                self.trim_history()
 
+            self.add_solutions(asks, values)
 
+            if self.end_round():
+                break
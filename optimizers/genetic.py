@@ -1,80 +1,129 @@
 import pygad
+import numpy as np
 
-from typing import Callable, Tuple, List
+import pickle
+
+from typing import Callable, Tuple, List, Optional
 
 from base import BaseOptimizer, Solution, SolutionPool
+from space import ParameterSpace, BoundsLike
 
 
 class GeneticOptimizer(BaseOptimizer):
-    def __init__(self, target_function: Callable, bounds: List[Tuple[float, float]],
-                 minimization: bool = True, *args, **kwargs):
+    """Генетический алгоритм на pygad с пакетной функцией приспособленности.
+
+    pygad передаёт в fitness_function пачки по fitness_batch_size особей
+    (по умолчанию всё поколение), они уходят в evaluate одним вызовом.
+    Приспособленность элиты и родителей pygad берёт из прошлого поколения,
+    поэтому в пул попадают только реально посчитанные особи. Гены - координаты
+    единичного куба пространства поиска.
+    """
+
+    def __init__(self, target_function: Callable, bounds: BoundsLike,
+                 minimization: bool = True, *args, num_generations: int = 500, num_parents_mating: int = 4,
+                 sol_per_pop: int = 20, fitness_batch_size: Optional[int] = None, parent_selection_type: str = "sss",
+                 keep_parents: int = 0, keep_elitism: int = 1, crossover_type: str = "uniform",
+                 mutation_type: str = 'random', mutation_percent_genes: float = 20, **kwargs):
         super().__init__(target_function, bounds, minimization, *args, **kwargs)
 
-        if self.minimization:
-            fitness_function = lambda ga, vector, idx :target_function(vector) * -1
-        else:
-            fitness_function = lambda ga, vector, idx :target_function(vector)
-
-        num_generations = 500
-        num_parents_mating = 4
-
-        sol_per_pop = 20
-        num_genes = len(bounds)
-
-        gen_space = self.bounds
-
-        parent_selection_type = "sss"
-        keep_parents = 0
+        # В начале run() pygad считает приспособленность всей популяции; для особей
+        # из контрольной точки или из предыдущего этапа она уже известна
+        self.known_fitness = None
 
-        crossover_type = "uniform"
+        def fitness_function(ga, vectors, idx):
+            fitness = np.full(len(vectors), np.nan)
+            if self.known_fitness is not None:
+                for i, vector in enumerate(vectors):
+                    fitness[i] = self.known_fitness.get(tuple(vector), np.nan)
 
-        mutation_type = 'random'
-        mutation_percent_genes = 20
+            missing = np.flatnonzero(np.isnan(fitness))
+            if len(missing):
+                missing_vectors = self.space.from_unit(np.asarray(vectors)[missing])
+                values = self.evaluate(missing_vectors)
+                self.add_solutions(missing_vectors, values)
+                fitness[missing] = -values if self.minimization else values
+            return fitness
 
+        num_genes = self.space.dimension
 
-        def on_start(ga_instance):
-            population = ga_instance.population
-            fitness_values = ga_instance.cal_pop_fitness()
-            for ind, fit in zip(population, fitness_values):
-                if self.minimization:
-                    solution = self.create_solution(ind, -1 * fit)
-                else:
-                    solution = self.create_solution(ind, fit)
-                self.solution_pool.add_solution(solution)
-
-        def on_generation(ga_instance):
-            population = ga_instance.population
-            fitnesses = ga_instance.last_generation_fitness
-
+        gen_space = self.bounds
 
-            for ind, fit in zip(population, fitnesses):
-                if self.minimization:
-                    solution = self.create_solution(ind, -1 * fit)
-                else:
-                    solution = self.create_solution(ind, fit)
-                self.solution_pool.add_solution(solution)
+        if fitness_batch_size is None:
+            fitness_batch_size = sol_per_pop
 
         self.ga_instance = pygad.GA(num_generations=num_generations,
                        num_parents_mating=num_parents_mating,
                        fitness_func=fitness_function,
+                       fitness_batch_size=fitness_batch_size,
                        sol_per_pop=sol_per_pop,
                        num_genes=num_genes,
                        parent_selection_type=parent_selection_type,
                        keep_parents=keep_parents,
+                       keep_elitism=keep_elitism,
                        crossover_type=crossover_type,
                        mutation_type=mutation_type,
                        mutation_percent_genes=mutation_percent_genes,
                        gene_space=gen_space,
-                       on_start=on_start,
-                       on_generation=on_generation)
-
+                       on_generation=self.on_generation)
+
+
+    def on_generation(self, ga):
+        self.known_fitness = None
+        if self.end_round():
+            return 'stop'
+
+    def accept_migrants(self, vectors, values):
+        # Мигранты заменяют худших особей, их приспособленность уже известна
+        ga = self.ga_instance
+        if getattr(ga, 'last_generation_fitness', None) is None:
+            return
+
+        vectors = self.space.to_unit(vectors)
+        fitness = -np.asarray(values, dtype=float) if self.minimization else np.asarray(values, dtype=float)
+
+        count = min(len(fitness), len(ga.population))
+        worst = np.argsort(ga.last_generation_fitness)[:count]
+        order = np.argsort(fitness)[::-1][:count]
+
+        ga.population[worst] = vectors[order]
+        ga.last_generation_fitness[worst] = fitness[order]
+
+    def seed(self, vectors, values):
+        # Стартовые точки занимают первые места начальной популяции и не пересчитываются
+        vectors = self.space.to_unit(vectors)
+        fitness = -np.asarray(values, dtype=float) if self.minimization else np.asarray(values, dtype=float)
+
+        count = min(len(fitness), len(self.ga_instance.population))
+        self.ga_instance.population[:count] = vectors[:count]
+        self.known_fitness = {tuple(vector): value for vector, value in
+                              zip(self.ga_instance.population[:count], fitness[:count])}
+
+    def get_state(self) -> dict:
+        state = super().get_state()
+        # Всё состояние pygad, кроме колбэков и логгера; генераторы случайных чисел pygad свои
+        ga_state = {key: value for key, value in self.ga_instance.__dict__.items()
+                    if not callable(value) and key != 'logger'}
+        state['ga'] = pickle.dumps(ga_state, protocol=pickle.HIGHEST_PROTOCOL)
+        return state
+
+    def set_state(self, state: dict):
+        super().set_state(state)
+        self.ga_instance.__dict__.update(pickle.loads(state['ga']))
+        self.remember_population()
+
+    def remember_population(self):
+        # Приспособленность текущей популяции, чтобы следующий run() не считал её заново
+        ga = self.ga_instance
+        if getattr(ga, 'last_generation_fitness', None) is None:
+            return
+        self.known_fitness = {tuple(vector): fitness for vector, fitness in
+                              zip(ga.population, ga.last_generation_fitness)}
 
     def optimize(self, rounds, *args, **kwargs):
         self.ga_instance.num_generations = rounds
 
         self.ga_instance.run()
+        self.remember_population()
 
-    def build_bounds(self, bounds: List[Tuple[float, float]]):
-        return [{'low': bound[0], 'high': bound[1]} for bound in bounds]
-
-
+    def build_bounds(self, space: ParameterSpace):
+        return [{'low': 0.0, 'high': 1.0} for _ in range(space.dimension)]
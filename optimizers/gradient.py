@@ -1,7 +1,8 @@
 import numpy as np
-from typing import Callable, Tuple, List
+from typing import Callable, Tuple, List, Optional
 import math
 from base import BaseOptimizer, Solution, SolutionPool
+from space import ParameterSpace, BoundsLike
 
 import os
 
@@ -9,19 +10,26 @@ import time
 
 
 class AdamWL2Optimizer(BaseOptimizer):
-    def __init__(self, target_function: Callable, bounds: List[Tuple[float, float]],
-                 minimization: bool = True, *args, **kwargs):
+    """Адам с затуханием весов; x, шаги и градиенты - в единичном кубе пространства поиска."""
+
+    def __init__(self, target_function: Callable, bounds: BoundsLike,
+                 minimization: bool = True, *args, gradient_type: str = 'stochastic',
+                 gradient_function: Optional[Callable] = None, directions: int = 1, antithetic: bool = True,
+                 orthogonal: bool = False, **kwargs):
         super().__init__(target_function, bounds, minimization, *args, **kwargs)
 
-        self.x = np.random.uniform(5, 6, len(self.bounds))
+        # В долях ширины интервалов; для коробки (0, 10) это прежние 0.05 и 0.0005.
+        # l2 и _lambda по-прежнему тянут к нулю исходных координат, см. decay_direction
+        self.gamma = 0.005
+        self.step = 0.00005
+
+        # Как прежний старт из (5, 6) в коробке (0, 10)
+        self.x = np.random.uniform(0.5, 0.6, self.space.dimension)
 
         self.x = self.apply_bounds(self.x)
 
         self.x_history = []
 
-        self.gamma = 0.05
-        self.step = 0.0005
-
         self.beta_1 = 0.99
         self.beta_2 = 0.999
 
@@ -33,6 +41,9 @@ class AdamWL2Optimizer(BaseOptimizer):
         self.m_hat = 0
         self.v_hat = 0
 
+        # Номер шага Адама для поправки смещения моментов
+        self.t = 0
+
         self.g = 0
 
         self.l2 = 0
@@ -41,73 +52,114 @@ class AdamWL2Optimizer(BaseOptimizer):
 
         self.gradient_centralization = False
 
-        self.gradient_type = 'stochastic'
+        # 'stochastic', 'full' или 'autodiff'
+        self.gradient_type = gradient_type
+        # Для 'autodiff': vector -> (значение, градиент), например value_and_grad функции потерь
+        self.gradient_function = gradient_function
         self.steps_distribution = 'Uniform'
 
+        # Для 'stochastic': число случайных направлений за шаг; все пробы уходят
+        # в оценщик одним пакетом, так что directions можно брать по числу ядер
+        self.directions = directions
+        # True - пары x +- step * d (2K проб); False - односторонние разности
+        # от общего центра x (K + 1 проба), центр служит общим контрольным значением
+        self.antithetic = antithetic
+        # Ортогонализовать направления внутри каждых dimension штук
+        self.orthogonal = orthogonal
+
+        if self.gradient_type == 'autodiff' and self.gradient_function is None:
+            raise ValueError("gradient_type='autodiff' requires gradient_function")
+
     def find_gradient(self):
         if self.gradient_type == 'stochastic':
             return self.stochastic_gradient()
+        elif self.gradient_type == 'full':
+            return self.full_gradient()
+        elif self.gradient_type == 'autodiff':
+            return self.autodiff_gradient()
         return 0
 
-    def full_gradient(self):
+    def autodiff_gradient(self):
+        vector = self.space.from_unit(self.x)
+
+        start = self.evaluation_started(1)
+        f, gradient = self.gradient_function(vector)
+        self.evaluation_finished(start, 1)
 
-        gradient = np.zeros_like(self.x)
+        solution = self.create_solution(vector, f)
 
-        for i in range(len(self.x)):
-            u_minus = self.x.copy()
-            u_plus = self.x.copy()
+        self.solution_pool.add_solution(solution)
+
+        # Градиент по координатам куба
+        return np.asarray(gradient) * self.space.unit_jacobian(self.x)
 
-            u_minus[i] -= self.step
-            u_plus[i] += self.step
+    def evaluate_unit(self, units):
+        vectors = self.space.from_unit(units)
+        values = self.evaluate(vectors)
+        self.add_solutions(vectors, values)
+        return values
 
-            m_plus = self.target_function(u_plus)
+    def full_gradient(self):
+        # Пары проб x + step * e_i, x - step * e_i подряд, одним пакетом
+        offsets = np.repeat(np.eye(len(self.x)) * self.step, 2, axis=0)
+        offsets[1::2] *= -1
 
-            m_minus = self.target_function(u_minus)
+        values = self.evaluate_unit(self.x + offsets)
 
-            gradient[i] = (m_plus - m_minus)
+        gradient = (values[0::2] - values[1::2]) / self.step / 2
 
         return gradient
 
-    def calc_steps(self):
+    def calc_steps(self, count: int = 1):
+        # count направлений строками матрицы (count x dimension)
         num = len(self.x)
-        steps = np.zeros(num)
+        steps = np.zeros((count, num))
 
         if self.steps_distribution == 'Bernoulli':
-            steps = np.random.choice([-1, 1], size=num)
+            steps = np.random.choice([-1, 1], size=(count, num)).astype(float)
 
         elif self.steps_distribution == 'Uniform':
-            steps = np.random.uniform(-1, 1, size=num)
+            steps = np.random.uniform(-1, 1, size=(count, num))
 
         elif self.steps_distribution == 'Coordinate':
-            steps[np.random.randint(num)] = np.random.choice([-1, 1])
+            steps[np.arange(count), np.random.randint(num, size=count)] = np.random.choice([-1, 1], size=count)
+
+        return steps
 
+    def orthogonalize(self, steps):
+        # Направления внутри блока из dimension штук делаются взаимно ортогональными, длины сохраняются
+        num = steps.shape[1]
+        for start in range(0, len(steps), num):
+            block = steps[start:start + num]
+            q, r = np.linalg.qr(block.T)
+            norms = np.linalg.norm(block, axis=1)
+            steps[start:start + num] = (q * np.sign(np.diag(r))).T * norms[:, None]
         return steps
 
     def stochastic_gradient(self):
-        steps = self.calc_steps()
+        # SPSA по directions направлениям, все пробы - одним пакетом
+        steps = self.calc_steps(self.directions)
+        count, num = steps.shape
 
-        num_zeros = np.random.randint(0, len(steps)//2)
-        indices = np.random.choice(len(steps), size=num_zeros, replace=False)
+        if self.steps_distribution != 'Coordinate':
+            # У каждого направления обнуляется случайная часть координат (меньше половины)
+            num_zeros = np.random.randint(0, max(num // 2, 1), size=count)
+            ranks = np.argsort(np.random.uniform(size=(count, num)), axis=1)
+            steps[ranks < num_zeros[:, None]] = 0
 
-        steps[indices] = 0
+        if self.orthogonal:
+            steps = self.orthogonalize(steps)
 
         u_plus = self.apply_bounds(self.x + steps * self.step)
-        u_minus = self.apply_bounds(self.x - steps * self.step)
-        m_plus = self.target_function(u_plus)
-
-        solution = self.create_solution(u_plus, m_plus)
-
-        self.solution_pool.add_solution(solution)
-
-        m_minus = self.target_function(u_minus)
-
-        solution = self.create_solution(u_minus, m_minus)
-
-        self.solution_pool.add_solution(solution)
-
-        gradient = (m_plus - m_minus) * steps / self.step / 2
+        if self.antithetic:
+            u_minus = self.apply_bounds(self.x - steps * self.step)
+            values = self.evaluate_unit(np.concatenate([u_plus, u_minus]))
+            differences = (values[:count] - values[count:]) / self.step / 2
+        else:
+            values = self.evaluate_unit(np.concatenate([self.x[None, :], u_plus]))
+            differences = (values[1:] - values[0]) / self.step
 
-        return gradient
+        return differences @ steps / count
 
     def optimize(self, rounds, *args, **kwargs):
         if self.minimization:
@@ -116,14 +168,13 @@ class AdamWL2Optimizer(BaseOptimizer):
             multiply = -1
         for i in range(rounds):
             self.gradient = self.find_gradient()
-            print(self.gradient, 'GRADIENT')
 
             if self.gradient_centralization:
                 self.gradient = self.gradient - np.mean(self.gradient)
 
 
             if len(self.x_history) != 0:
-                self.g = self.gradient +  self.x_history[-1] * self.l2
+                self.g = self.gradient + self.l2_gradient(self.x_history[-1])
                 self.m = self.beta_1 * self.m + (1 - self.beta_1) * self.g
                 self.v = self.beta_2 * self.v + (1 - self.beta_2) * self.g ** 2
             else:
@@ -131,26 +182,73 @@ class AdamWL2Optimizer(BaseOptimizer):
                 self.m = self.gradient
                 self.v = self.gradient**2
 
-            self.m_hat = self.m / (1 - self.beta_1 ** (i + 1))
-            self.v_hat = self.v / (1 - self.beta_2 ** (i + 1))
+            self.t += 1
+
+            self.m_hat = self.m / (1 - self.beta_1 ** self.t)
+            self.v_hat = self.v / (1 - self.beta_2 ** self.t)
 
             self.x = self.x - multiply * self.gamma * self.m_hat / (np.sqrt(self.v_hat) + self.epsilon)
 
             if len(self.x_history) != 0:
-                self.x = self.x - multiply * self.gamma * self._lambda * self.x_history[-1]
+                self.x = self.x - multiply * self.gamma * self._lambda * self.decay_direction(self.x_history[-1])
 
             self.x = self.apply_bounds(self.x)
 
             self.x_history.append(self.x)
 
-    def build_bounds(self, bounds):
-        return bounds
+            if self.end_round():
+                break
 
-    def apply_bounds(self, vector):
+    def l2_gradient(self, units):
+        # Градиент штрафа l2 / 2 * |x|^2 по исходным координатам, пересчитанный в куб
+        return self.l2 * self.space.from_unit(units) * self.space.unit_jacobian(units)
 
-        for counter, item in enumerate(vector):
-            if item < self.bounds[counter][0]:
-                vector[counter] = self.bounds[counter][0] + np.random.uniform(0, self.bounds[counter][1]/10000) * self.step
-            elif item > self.bounds[counter][1]:
-                vector[counter] = self.bounds[counter][1]- np.random.uniform(0, self.bounds[counter][1]/10000) * self.step
-        return vector
+    def decay_direction(self, units):
+        # Затухание весов к нулю исходных координат. Шаг в исходных координатах
+        # gamma * _lambda * x * (high - low) переводится в куб, так что для линейных
+        # границ это gamma * _lambda * x, как раньше при шаге 0.05 в коробке (0, 10)
+        space = self.space
+        return space.from_unit(units) * (space.high - space.low) / space.unit_jacobian(units)
+
+    def accept_migrants(self, vectors, values):
+        # Если чужое решение лучше всего найденного здесь, спуск перезапускается из него
+        values = np.asarray(values, dtype=float)
+        sign = 1 if self.minimization else -1
+        best = np.argmin(sign * values)
+
+        own_best = self.solution_pool.best_value
+        if own_best is not None and sign * values[best] >= sign * own_best:
+            return
+
+        self.restart(vectors[best])
+
+    def seed(self, vectors, values):
+        self.restart(vectors[0])
+
+    def restart(self, vector):
+        self.x = self.apply_bounds(self.space.to_unit(vector))
+        self.x_history = []
+        self.m = 0
+        self.v = 0
+        self.t = 0
+
+    def get_state(self) -> dict:
+        state = super().get_state()
+        # Из истории x шагу нужен только последний элемент
+        state.update({'x': np.array(self.x), 'x_history': [np.array(x) for x in self.x_history[-1:]],
+                      'm': np.array(self.m), 'v': np.array(self.v), 't': self.t})
+        return state
+
+    def set_state(self, state: dict):
+        super().set_state(state)
+        self.x = state['x']
+        self.x_history = list(state['x_history'])
+        self.m = state['m']
+        self.v = state['v']
+        self.t = state['t']
+
+    def build_bounds(self, space: ParameterSpace):
+        return space.tuples()
+
+    def apply_bounds(self, units):
+        return self.space.repair_unit(units)
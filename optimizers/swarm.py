@@ -3,151 +3,141 @@ import numpy as np
 from typing import Callable, Tuple, List
 
 from base import BaseOptimizer, Solution, SolutionPool
+from space import ParameterSpace, BoundsLike
 
-import time
 
+class SwarmOptimizer(BaseOptimizer):
+    """Рой частиц, хранящийся массивами (swarm_size x dimension).
 
-class Agent:
-    def __init__(self, position, personal_velocity, global_velocity, target_function, bounds,
-                 minimization: bool = True):
-        self.position = np.asarray(position)
-        self.personal_velocity = personal_velocity
-        self.global_velocity = global_velocity
+    Позиции, скорости и личные оптимумы обновляются векторно в единичном
+    кубе пространства поиска, весь рой оценивается одним пакетным вызовом
+    за итерацию.
+    """
 
-        self.target_function = target_function
+    repair_mode = 'reflect'
 
-        self.bounds = bounds
+    def __init__(self, target_function: Callable, bounds: BoundsLike,
+                 minimization: bool = True, *args, swarm_size: int = 1000, personal_velocity: float = 0.21,
+                 global_velocity: float = 0.8, inertia: float = 0.0, **kwargs):
+        super().__init__(target_function, bounds, minimization, *args, **kwargs)
 
-        self.known_optimum = None
-        self.known_optimum_vector = None
+        swarm_params = {'global_velocity': global_velocity, 'personal_velocity': personal_velocity,
+                        'inertia': inertia}
 
-        self.global_known_optimum = None
-        self.global_known_optimum_vector = None
+        self.swarm_params = swarm_params
+
+        self.swarm_size = swarm_size
+        self.personal_velocity = self.swarm_params["personal_velocity"]
+        self.global_velocity = self.swarm_params["global_velocity"]
+        self.inertia = self.swarm_params["inertia"]
 
-        self.minimization = minimization
+        # Сравниваем sign * f, чтобы минимизация и максимизация шли одним кодом
+        self.sign = 1 if self.minimization else -1
 
-    def apply_bounds(self, vector):
-        for counter, item in enumerate(vector):
-            if item < self.bounds[counter][0]:
-                vector[counter] = self.bounds[counter][0] + np.random.uniform(0, self.bounds[counter][1]/2)
-            elif item > self.bounds[counter][1]:
-                vector[counter] = self.bounds[counter][1] - np.random.uniform(0, self.bounds[counter][0]/2)
-        return vector
+        self.positions = self.create_start_population()
+        self.velocities = np.zeros_like(self.positions)
 
-    def do_step(self):
+        self.personal_best_vectors = self.positions.copy()
+        self.personal_best_scores = np.full(self.swarm_size, np.inf)
 
-        r1 = np.random.uniform(0, 1)
-        r2 = np.random.uniform(0, 1)
+        self.known_optimum = None
+        self.known_optimum_vector = None
 
-        if self.known_optimum is None:
-            personal_direction = np.random.uniform(-1, 1, self.position.shape)
-        else:
-            personal_direction = self.known_optimum_vector - self.position
+    def create_start_population(self):
+        return self.space.sample_unit(self.swarm_size)
 
-        if self.global_known_optimum is None:
-            global_direction = np.random.uniform(-1, 1, self.position.shape)
-        else:
-            global_direction = self.global_known_optimum_vector - self.position
+    def build_bounds(self, space: ParameterSpace):
+        return space.tuples()
 
-        self.position = (self.position + r1 * self.personal_velocity * personal_direction +
-                         r2 * self.global_velocity * global_direction)
+    def apply_bounds(self, positions):
+        return self.space.repair_unit(positions)
 
-        self.position = self.position + np.random.uniform(-0.01,0.01, self.position.shape)
+    def move(self):
+        shape = self.positions.shape
 
-        self.position = self.apply_bounds(self.position)
+        r1 = np.random.uniform(0, 1, (shape[0], 1))
+        r2 = np.random.uniform(0, 1, (shape[0], 1))
 
-        f = self.target_function(self.position)
+        # Пока личного оптимума нет, агент идёт в случайном направлении
+        has_personal = np.isfinite(self.personal_best_scores)[:, None]
+        personal_direction = np.where(has_personal, self.personal_best_vectors - self.positions,
+                                      np.random.uniform(-1, 1, shape))
 
         if self.known_optimum_vector is None:
-            self.known_optimum_vector = self.position
-            self.known_optimum = f
-        elif self.minimization:
-            if self.known_optimum > f:
-                self.known_optimum = f
+            global_direction = np.random.uniform(-1, 1, shape)
         else:
-            if self.known_optimum < f:
-                self.known_optimum = f
-        return self.position, f
-
+            global_direction = self.known_optimum_vector - self.positions
 
-class SwarmOptimizer(BaseOptimizer):
-    def __init__(self, target_function: Callable, bounds: List[Tuple[float, float]],
-                 minimization: bool = True, *args, **kwargs):
-        super().__init__(target_function, bounds, minimization, *args, **kwargs)
+        self.velocities = (self.inertia * self.velocities + r1 * self.personal_velocity * personal_direction +
+                           r2 * self.global_velocity * global_direction)
 
-        swarm_params = {'global_velocity': 0.8, 'personal_velocity': 0.21}
+        # Шум 0.001 куба - прежние 0.01 для коробки (0, 10)
+        self.positions = self.positions + self.velocities + np.random.uniform(-0.001, 0.001, shape)
 
-        self.swarm_params = swarm_params
+        self.positions = self.apply_bounds(self.positions)
 
-        self.swarm_size = 1000
-        self.personal_velocity = self.swarm_params["personal_velocity"]
-        self.global_velocity = self.swarm_params["global_velocity"]
+        return self.positions
 
-        self.population = self.create_start_population()
+    def update_knowledge(self, values):
+        scores = self.sign * values
 
-        self.known_optimum = None
-        self.known_optimum_vector = None
+        improved = scores < self.personal_best_scores
+        self.personal_best_scores[improved] = scores[improved]
+        self.personal_best_vectors[improved] = self.positions[improved]
 
+        best = np.argmin(self.personal_best_scores)
 
-    def create_start_population(self):
-        agents = []
-        for _ in range(self.swarm_size):
-            vector = []
-            for min_val, max_val in self.bounds:
-                value = np.random.uniform(min_val, max_val)
-                vector.append(value)
-            agents.append(
-                Agent(vector, self.personal_velocity, self.global_velocity, self.target_function, self.bounds))
-
-        return agents
-
-    def build_bounds(self, bounds):
-        return bounds
-
-
-    def update_global_knowledge(self):
-        sorted_agents = sorted(self.population, key=lambda agent: agent.known_optimum)
-        if self.minimization:
-            optimum = sorted_agents[0].known_optimum
-            optimum_vector =sorted_agents[0].position
-        else:
-            optimum = sorted_agents[0].known_optimum
-            optimum_vector = sorted_agents[0].position
+        if self.known_optimum is None or self.personal_best_scores[best] < self.sign * self.known_optimum:
+            self.known_optimum = self.sign * self.personal_best_scores[best]
+            self.known_optimum_vector = self.personal_best_vectors[best].copy()
 
-        if self.known_optimum_vector is None:
-            self.known_optimum_vector = optimum_vector
-            self.known_optimum = optimum
+    def accept_migrants(self, vectors, values):
+        # Мигранты занимают места худших частиц вместе с их личными оптимумами
+        vectors = self.space.to_unit(vectors)
+        scores = self.sign * np.asarray(values, dtype=float)
 
-        elif self.minimization:
-            if self.known_optimum > optimum:
-                self.known_optimum = optimum
-                self.known_optimum_vector = optimum_vector
+        count = min(len(scores), self.swarm_size)
+        worst = np.argsort(self.personal_best_scores)[::-1][:count]
+        order = np.argsort(scores)[:count]
 
-        else:
-            if self.known_optimum < optimum:
-                self.known_optimum = optimum
-                self.known_optimum_vector = optimum_vector
+        self.positions[worst] = vectors[order]
+        self.velocities[worst] = 0
+        self.personal_best_vectors[worst] = vectors[order]
+        self.personal_best_scores[worst] = scores[order]
 
+        if self.known_optimum is None or scores[order[0]] < self.sign * self.known_optimum:
+            self.known_optimum = self.sign * scores[order[0]]
+            self.known_optimum_vector = vectors[order[0]].copy()
 
+    def get_state(self) -> dict:
+        state = super().get_state()
+        state.update({'positions': self.positions.copy(), 'velocities': self.velocities.copy(),
+                      'personal_best_vectors': self.personal_best_vectors.copy(),
+                      'personal_best_scores': self.personal_best_scores.copy(),
+                      'known_optimum': self.known_optimum,
+                      'known_optimum_vector': None if self.known_optimum_vector is None
+                      else self.known_optimum_vector.copy()})
+        return state
 
-    def tell_them_all(self):
-        if self.known_optimum is not None:
-            for agent in self.population:
-                agent.global_known_optimum = self.known_optimum
-                agent.global_known_optimum_vector = self.known_optimum_vector
+    def set_state(self, state: dict):
+        super().set_state(state)
+        self.positions = state['positions']
+        self.velocities = state['velocities']
+        self.personal_best_vectors = state['personal_best_vectors']
+        self.personal_best_scores = state['personal_best_scores']
+        self.known_optimum = state['known_optimum']
+        self.known_optimum_vector = state['known_optimum_vector']
+        self.swarm_size = len(self.positions)
 
     def optimize(self, rounds, *args, **kwargs):
         for i in range(rounds):
-            self.tell_them_all()
-
-            for agent in self.population:
-                ask, f = agent.do_step()
-
-                solution = self.create_solution(ask, f)
-
-                self.solution_pool.add_solution(solution)
+            asks = self.space.from_unit(self.move())
 
+            values = self.evaluate(asks)
 
+            self.update_knowledge(values)
 
+            self.add_solutions(asks, values)
 
-            self.update_global_knowledge()
+            if self.end_round():
+                break
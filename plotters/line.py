@@ -1,33 +1,90 @@
+import numpy as np
 import matplotlib.pyplot as plt
 
+import threading
+import time
+
 from base import SolutionPool, Solution, BasePlotter
 
 
-class LinePlotter(BasePlotter):
-    def plot_solution_pool(self, solution_pool: SolutionPool, *args, **kwargs):
-        min_history, current_history, max_history = [], [], []
-        start = solution_pool.solutions[0].function_value
-        min_value, max_value = start, start
+def minmax_downsample(values: np.ndarray, max_points: int):
+    """Оставляет минимум и максимум каждого из max_points // 2 отрезков, чтобы пики не терялись.
+
+    Первая и последняя точки остаются всегда, чтобы линия шла по всей оси.
+    """
+    count = len(values)
+    if count <= max_points:
+        return np.arange(count), values
+
+    size = int(np.ceil(count / (max_points // 2)))
+    usable = count // size * size
 
-        for solution in solution_pool.solutions:
-            if solution.function_value < min_value:
-                min_value = solution.function_value
+    buckets = values[:usable].reshape(-1, size)
+    offsets = np.arange(0, usable, size)
+    indices = [np.array([0, count - 1]), buckets.argmin(axis=1) + offsets, buckets.argmax(axis=1) + offsets]
 
-            min_history.append(min_value)
+    if usable < count:
+        tail = values[usable:]
+        indices.append(np.array([tail.argmin(), tail.argmax()]) + usable)
 
-            current_history.append(solution.function_value)
+    indices = np.unique(np.concatenate(indices))
+    return indices, values[indices]
 
-            if solution.function_value > max_value:
-                max_value = solution.function_value
 
-            max_history.append(max_value)
+class LinePlotter(BasePlotter):
+    """Графики текущего значения, минимума и максимума по истории пула.
+
+    Линии создаются один раз и получают новые данные через set_data.
+    Перерисовка происходит не чаще, чем раз в redraw_every решений или
+    redraw_interval секунд, длинная история прореживается до max_points точек.
+    Данные готовятся в потоке репортёра, а окно обновляет redraw() в главном потоке.
+    """
 
-        self.ax.clear()
+    def __init__(self, redraw_every: int = 100, redraw_interval: float = 0.5, max_points: int = 2000):
+        super().__init__()
 
-        self.ax.plot(min_history, label='min')
-        self.ax.plot(max_history, label='max')
-        self.ax.plot(current_history, label='current')
+        self.redraw_every = redraw_every
+        self.redraw_interval = redraw_interval
+        self.max_points = max_points
+
+        self.lines = {name: self.ax.plot([], [], label=name)[0] for name in ('min', 'max', 'current')}
         self.ax.legend()
 
-        self.fig.canvas.draw()
+        self.drawn_count = 0
+        self.last_draw = 0.0
+
+        self.lock = threading.Lock()
+        self.pending_data = None
+
+    def plot_solution_pool(self, solution_pool: SolutionPool, *args, force: bool = False, **kwargs):
+        count = solution_pool.count
+        if count == 0 or count == self.drawn_count:
+            return
+
+        if (not force and count - self.drawn_count < self.redraw_every and
+                time.monotonic() - self.last_draw < self.redraw_interval):
+            return
+
+        # Истории минимума и максимума пул поддерживает сам, здесь только прореживание
+        data = {name: minmax_downsample(values, self.max_points)
+                for name, values in (('min', solution_pool.min_history), ('max', solution_pool.max_history),
+                                     ('current', solution_pool.values))}
+        with self.lock:
+            self.pending_data = data
+
+        self.drawn_count = count
+        self.last_draw = time.monotonic()
+
+    def redraw(self):
+        with self.lock:
+            data, self.pending_data = self.pending_data, None
+
+        if data is not None:
+            for name, (indices, points) in data.items():
+                self.lines[name].set_data(indices, points)
+            self.ax.relim()
+            self.ax.autoscale_view()
+            self.fig.canvas.draw_idle()
+
+        # Цикл событий окна прокачивается, даже когда новых данных нет
         self.fig.canvas.flush_events()
@@ -1,55 +1,265 @@
-import matplotlib.pyplot as plt
+import numpy as np
 
-from typing import Callable, Type, List, Tuple
+import threading
 
-from base import Solution, SolutionPool, BaseOptimizer, BasePlotter
+from typing import Callable, Type, List, Tuple, Optional
+
+from base import Solution, SolutionPool, BaseOptimizer, BasePlotter, BaseEvaluator
+from space import BoundsLike
+from storage.log import SolutionLog
+from storage.checkpoint import Checkpointer, load_checkpoint
+from reporter import Reporter
+from islands import LockedListener, run_in_threads
+from stopping import StoppingRule, StopController, AnyOf, WallClock, EvaluationBudget
+
+
+class Stage:
+    """Этап конвейера OptimizationProcess.run_pipeline.
+
+    Этап заканчивается после rounds раундов, max_evaluations вычислений
+    целевой функции или max_time секунд - что наступит раньше. top_k лучших
+    решений пула передаются следующему этапу как стартовые точки. При
+    parallel > 1 этап запускает столько копий оптимизатора в потоках, и
+    i-я копия стартует с i-го кандидата (например, несколько Адамов из
+    лучших точек роя). Дополнительные правила остановки (stopping.py)
+    передаются через stopping.
+    """
+
+    def __init__(self, optimizer: Type[BaseOptimizer], optimizer_kwargs: dict = None, rounds: Optional[int] = None,
+                 max_evaluations: Optional[int] = None, max_time: Optional[float] = None, top_k: int = 1,
+                 parallel: int = 1, stopping: Optional[StoppingRule] = None):
+        if rounds is None and max_evaluations is None and max_time is None and stopping is None:
+            raise ValueError('stage needs rounds, max_evaluations, max_time or stopping')
+
+        self.optimizer = optimizer
+        self.optimizer_kwargs = optimizer_kwargs or {}
+        # Без числа раундов этап ограничен только бюджетом
+        self.rounds = rounds if rounds is not None else 10 ** 9
+        self.max_evaluations = max_evaluations
+        self.max_time = max_time
+        self.top_k = top_k
+        self.parallel = parallel
+        self.stopping = stopping
+
+    def stopping_rule(self) -> Optional[StoppingRule]:
+        rules = []
+        if self.max_time is not None:
+            rules.append(WallClock(self.max_time))
+        if self.max_evaluations is not None:
+            rules.append(EvaluationBudget(self.max_evaluations))
+        if self.stopping is not None:
+            rules.append(self.stopping)
+        return AnyOf(*rules) if rules else None
 
 
 class OptimizationProcess:
     def __init__(self, target_function: Callable,
-                 optimizer: Type[BaseOptimizer], bounds: List[Tuple[float, float]], minimization: bool = True,
-                 plotter: Type[BasePlotter] = None) -> None:
+                 optimizer: Type[BaseOptimizer], bounds: BoundsLike, minimization: bool = True,
+                 plotter: Type[BasePlotter] = None, batch_target: Callable = None,
+                 optimizer_kwargs: dict = None, evaluator: BaseEvaluator = None, sinks: list = None,
+                 summary_interval: float = 1.0) -> None:
 
         self.target_function = target_function
+        self.batch_target = batch_target
+        self.bounds = bounds
+        self.evaluator = evaluator
 
         self.minimization = minimization
 
-        optimizer = optimizer(target_function, bounds, minimization)
+        if optimizer_kwargs is None:
+            optimizer_kwargs = {}
+
+        optimizer = optimizer(target_function, bounds, minimization, batch_target=batch_target, evaluator=evaluator,
+                              **optimizer_kwargs)
 
-        self.solutions_pool = SolutionPool()
+        self.solutions_pool = SolutionPool(minimization=minimization)
 
         self.optimizer = None
 
         self.accept_optimizer(optimizer)
 
         self.solutions_pool.onNewSolution = self.new_solution_callback
+        self.solutions_pool.onNewSolutions = self.new_solutions_callback
 
         if plotter:
             self.plotter = plotter()
         else:
             self.plotter = None
 
+        self.metrics = self.optimizer.metrics
+
+        self.checkpointer = None
+        self.iterations_target = 0
+        # Почему закончился последний optimize или этап конвейера
+        self.stop_reason: Optional[str] = None
+
+        # Графики и сводки строятся в фоновом потоке; sinks=[] отключает вывод в консоль
+        self.reporter = Reporter(self.solutions_pool, self.plotter, sinks, summary_interval, metrics=self.metrics)
+
     def new_solution_callback(self, solution: Solution):
+        with self.metrics.timed('callback'):
+            self.reporter.submit(solution)
+
+    def new_solutions_callback(self, vectors, values, source=None):
+        # Из пакета репортёру нужно только последнее решение
+        with self.metrics.timed('callback', len(values)):
+            self.reporter.submit(self.solutions_pool.solution(self.solutions_pool.count - 1))
+
+    def metrics_snapshot(self) -> dict:
+        return self.metrics.snapshot()
 
-        if self.plotter:
-            self.plotter.plot_solution_pool(self.solutions_pool)
-        print('Лучшее', self.find_best().function_value)
-        print(self.find_best().vector)
-        print(len(self.solutions_pool.solutions))
+    def enable_metrics_dump(self, path: str, interval: float = 60.0):
+        self.metrics.enable_dump(path, interval)
 
-        print('Текущее', solution)
-        print('\n\n')
+    def profile(self, start_round: int, stop_round: int, path: str, sampling: bool = False):
+        # cProfile (или сэмплирующий профилировщик) на раунды [start_round, stop_round)
+        self.metrics.profile(start_round, stop_round, path, sampling)
 
     def accept_optimizer(self, optimizer):
         self.optimizer = optimizer
         self.optimizer.solution_listener = self.solutions_pool
+        # График перерисовывается между раундами, в потоке оптимизатора (обычно главном)
+        self.optimizer.round_callbacks.append(self.redraw)
 
+    def redraw(self):
+        self.reporter.redraw()
 
-    def find_best(self):
-        if self.minimization:
-            return self.solutions_pool.min_solution()
+
+    def enable_checkpoints(self, path: str, interval: float = 300.0):
+        # Раз в interval секунд состояние оптимизатора пишется в path в фоновом потоке
+        self.checkpointer = Checkpointer(path, self.get_state, interval)
+        self.optimizer.checkpointer = self.checkpointer
+
+    def get_state(self) -> dict:
+        # Вместо всей истории сохраняются лучшие решения; полная история - в журнале (log_solutions)
+        best = self.solutions_pool.top_k(self.solutions_pool.top_k_size) if self.solutions_pool.count else []
+        return {'optimizer': self.optimizer.get_state(),
+                'iterations_target': self.iterations_target,
+                'best_vectors': np.array([solution.vector for solution in best]),
+                'best_values': np.array([solution.function_value for solution in best]),
+                'best_timestamps': np.array([solution.timestamp for solution in best]),
+                'best_sources': [solution.source for solution in best]}
+
+    def set_state(self, state: dict):
+        self.optimizer.set_state(state['optimizer'])
+        self.iterations_target = state['iterations_target']
+
+        pool = self.solutions_pool
+        if pool.count == 0 and len(state['best_values']):
+            source_ids = np.array([pool.source_id(source) for source in state['best_sources']], dtype=np.int32)
+            pool.append_columns(state['best_vectors'], state['best_values'], state['best_timestamps'], source_ids)
+
+    def resume(self, path: str, iterations: int = None, stopping: Optional[StoppingRule] = None) -> str:
+        """Продолжает оптимизацию с контрольной точки path.
+
+        По умолчанию выполняется столько раундов, сколько оставалось до конца
+        прерванного optimize. Журнал решений, если нужен, подключается через
+        log_solutions до вызова resume.
+        """
+        self.set_state(load_checkpoint(path))
+        if iterations is None:
+            iterations = self.iterations_target - self.optimizer.rounds_done
+        return self.optimize(iterations, stopping)
+
+    def run_pipeline(self, stages: List[Stage], stopping: Optional[StoppingRule] = None):
+        """Выполняет этапы по очереди, передавая лучшие решения каждого этапа следующему.
+
+        stopping ограничивает весь конвейер: его бюджеты не обнуляются между
+        этапами, и после его срабатывания оставшиеся этапы не запускаются.
+        """
+        controller = StopController(stopping, self.solutions_pool, self.metrics) if stopping is not None else None
+        seeds = None
+        self.reporter.start()
+        try:
+            for stage in stages:
+                self.run_stage(stage, seeds, controller)
+                if controller is not None and controller.reason is not None:
+                    break
+                best = self.solutions_pool.top_k(stage.top_k)
+                seeds = (np.array([solution.vector for solution in best]),
+                         np.array([solution.function_value for solution in best]))
+        finally:
+            self.reporter.stop()
+
+    def run_stage(self, stage: Stage, seeds=None, pipeline_controller: Optional[StopController] = None) -> str:
+        rule = stage.stopping_rule()
+        controller = StopController(rule, self.solutions_pool, self.metrics) if rule is not None else None
+        controllers = [c for c in (controller, pipeline_controller) if c is not None]
+        stop_condition = (lambda: any(c() for c in controllers)) if controllers else None
+
+        # Кэш вычислений общий для всех этапов, если этап не задал свой
+        optimizer_kwargs = {'cache': self.optimizer.cache, **stage.optimizer_kwargs}
+
+        optimizers = []
+        for i in range(stage.parallel):
+            optimizer = stage.optimizer(self.target_function, self.bounds, self.minimization,
+                                        batch_target=self.batch_target, evaluator=self.evaluator,
+                                        metrics=self.metrics, **optimizer_kwargs)
+            if seeds is not None and len(seeds[1]):
+                shift = i % len(seeds[1])
+                optimizer.seed(np.roll(seeds[0], -shift, axis=0), np.roll(seeds[1], -shift))
+            optimizer.stop_condition = stop_condition
+            optimizers.append(optimizer)
+
+        if stage.parallel == 1:
+            self.accept_optimizer(optimizers[0])
+            optimizers[0].optimize(stage.rounds)
         else:
-            return self.solutions_pool.max_solution()
+            lock = threading.Lock()
+            for i, optimizer in enumerate(optimizers):
+                optimizer.name = f'{optimizer.name}-{i}'
+                optimizer.solution_listener = LockedListener(self.solutions_pool, lock)
+            run_in_threads(optimizers, stage.rounds, on_wait=self.redraw)
+            self.optimizer = optimizers[0]
+
+        reasons = [c.reason for c in controllers if c.reason is not None]
+        self.stop_reason = reasons[0] if reasons else f'rounds: {stage.rounds} done'
+        return self.stop_reason
+
+    @staticmethod
+    def finish_reason(controller: Optional[StopController], rounds: int) -> str:
+        if controller is not None and controller.reason is not None:
+            return controller.reason
+        return f'rounds: {rounds} done'
+
+    def find_best(self):
+        return self.solutions_pool.best_solution()
+
+    def optimize(self, iterations, stopping: Optional[StoppingRule] = None) -> str:
+        """Выполняет до iterations раундов; stopping может закончить оптимизацию раньше.
+
+        Возвращает причину остановки, она же остаётся в stop_reason.
+        """
+        self.iterations_target = self.optimizer.rounds_done + iterations
+        controller = StopController(stopping, self.solutions_pool, self.metrics) if stopping is not None else None
+        previous_condition = self.optimizer.stop_condition
+        if controller is not None:
+            self.optimizer.stop_condition = controller
+
+        self.reporter.start()
+        try:
+            self.optimizer.optimize(iterations)
+        finally:
+            self.reporter.stop()
+            self.optimizer.stop_condition = previous_condition
+        if self.checkpointer is not None:
+            self.checkpointer.save()
+
+        self.stop_reason = self.finish_reason(controller, iterations)
+        return self.stop_reason
+
+    def log_solutions(self, path: str, chunk_size: int = 4096, flush_interval: float = 30.0):
+        # Если журнал уже есть, история из него восстанавливается и запись продолжается
+        log = SolutionLog(path, chunk_size, flush_interval)
+        self.solutions_pool.read_log(log)
+        self.solutions_pool.attach_log(log, write_existing=False)
 
-    def optimize(self, iterations):
-        self.optimizer.optimize(iterations)
+    def close(self):
+        self.reporter.close()
+        if self.checkpointer is not None:
+            self.checkpointer.close()
+        self.metrics.close()
+        self.solutions_pool.close_log()
+        self.optimizer.evaluator.close()
+        if self.optimizer.cache is not None:
+            self.optimizer.cache.close()
@@ -0,0 +1,70 @@
+"""Реестр оптимизаторов, целевых функций и графиков.
+
+Записи хранятся как строки 'модуль:имя' и импортируются только при выборе:
+skopt, pygad, JAX/rydopt и matplotlib загружаются, лишь если выбранный
+компонент их использует.
+"""
+from importlib import import_module
+from typing import Callable, Dict, Optional
+
+
+OPTIMIZERS: Dict[str, str] = {
+    'adam': 'optimizers.gradient:AdamWL2Optimizer',
+    'swarm': 'optimizers.swarm:SwarmOptimizer',
+    'genetic': 'optimizers.genetic:GeneticOptimizer',
+    'bayesian': 'optimizers.bayesian:BayesianOptimizer',
+}
+
+# Целевые функции, которые можно использовать как есть
+TARGETS: Dict[str, str] = {
+    'sum': 'target.test:vector_sum',
+    'sphere': 'target.test:vector_quadratic_sum',
+    'mul': 'target.test:vector_mul',
+    'trig': 'target.test:vector_trig',
+    'rastrigin': 'target.test:vector_rastrigin',
+}
+
+# Фабрики дорогих целевых функций: вызываются без аргументов и строят цель
+TARGET_FACTORIES: Dict[str, str] = {
+    'gate': 'target.gate:default_gate_loss',
+}
+
+PLOTTERS: Dict[str, str] = {
+    'line': 'plotters.line:LinePlotter',
+}
+
+
+def load(path: str):
+    module_name, attribute = path.split(':')
+    return getattr(import_module(module_name), attribute)
+
+
+def lookup(registry: Dict[str, str], name: str, kind: str) -> str:
+    if name not in registry:
+        raise KeyError(f"unknown {kind} {name!r}, expected one of {sorted(registry)}")
+    return registry[name]
+
+
+def register(registry: Dict[str, str], name: str, path: str):
+    # Например register(OPTIMIZERS, 'my', 'my_package.module:MyOptimizer')
+    registry[name] = path
+
+
+def optimizer(name: str):
+    return load(lookup(OPTIMIZERS, name, 'optimizer'))
+
+
+def target(name: str) -> Callable:
+    if name in TARGET_FACTORIES:
+        return load(TARGET_FACTORIES[name])()
+    return load(lookup(TARGETS, name, 'target'))
+
+
+def target_names():
+    return sorted(TARGETS) + sorted(TARGET_FACTORIES)
+
+
+def plotter(name: Optional[str]):
+    if name is None or name == 'none':
+        return None
+    return load(lookup(PLOTTERS, name, 'plotter'))
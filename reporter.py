@@ -0,0 +1,160 @@
+import numpy as np
+
+import json
+import queue
+import threading
+import time
+import traceback
+
+from typing import List, Optional
+
+from base import Solution, SolutionPool, BasePlotter
+from metrics import Metrics
+
+
+class ConsoleSink:
+    def write(self, summary: dict):
+        if summary['best_value'] is None:
+            print('Лучшее: конечных значений пока нет')
+        else:
+            print('Лучшее', summary['best_value'])
+            print(np.asarray(summary['best_vector']))
+        print(summary['count'])
+        print('Текущее', summary['current_value'], '(пропущено', summary['dropped'], ')')
+        print('\n')
+
+
+class JsonLinesSink:
+    def __init__(self, path: str):
+        self.file = open(path, 'a')
+
+    def write(self, summary: dict):
+        self.file.write(json.dumps(summary) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Reporter:
+    """Отчёты о ходе оптимизации в фоновом потоке.
+
+    Колбэк пула только кладёт решение в ограниченную очередь. Поток забирает
+    из неё всё накопившееся, оставляет последнее решение, обновляет график и
+    не чаще раза в summary_interval секунд отдаёт сводку в sinks. Если
+    очередь полна, решение не ждёт, а отбрасывается: статистики всё равно
+    берутся из пула. Окно графика перерисовывает redraw(), который владелец
+    вызывает из главного потока (между раундами или в ожидании потоков).
+    """
+
+    def __init__(self, solution_pool: SolutionPool, plotter: Optional[BasePlotter] = None,
+                 sinks: Optional[List] = None, summary_interval: float = 1.0, queue_size: int = 1024,
+                 metrics: Optional[Metrics] = None):
+        self.solution_pool = solution_pool
+        self.metrics = Metrics() if metrics is None else metrics
+        self.plotter = plotter
+        self.sinks = [ConsoleSink()] if sinks is None else sinks
+        self.summary_interval = summary_interval
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+        self.latest: Optional[Solution] = None
+        self.pending = False
+        self.last_summary = 0.0
+
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+
+    def submit(self, solution: Solution):
+        try:
+            self.queue.put_nowait(solution)
+        except queue.Full:
+            self.dropped += 1
+            self.metrics.count('reports_dropped')
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='reporter', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        # Ошибка графика или вывода не должна прерывать оптимизацию
+        try:
+            self.report(force=True)
+            self.redraw()
+        except Exception:
+            self.metrics.count('report_errors')
+            traceback.print_exc()
+
+    def redraw(self):
+        if self.plotter and threading.current_thread() is threading.main_thread():
+            with self.metrics.timed('plotting'):
+                self.plotter.redraw()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.take(self.queue.get(timeout=self.summary_interval))
+            except queue.Empty:
+                pass
+            try:
+                self.report()
+            except Exception:
+                # Поток продолжает работать: следующая сводка может пройти
+                self.metrics.count('report_errors')
+                traceback.print_exc()
+
+    def take(self, solution: Solution):
+        # Промежуточные решения схлопываются в последнее
+        while True:
+            self.latest = solution
+            self.pending = True
+            try:
+                solution = self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def report(self, force: bool = False):
+        try:
+            self.take(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if not self.pending:
+            return
+
+        if self.plotter:
+            with self.metrics.timed('plotting'):
+                self.plotter.plot_solution_pool(self.solution_pool, force=force)
+
+        if force or time.monotonic() - self.last_summary >= self.summary_interval:
+            with self.metrics.timed('summary'):
+                summary = self.summary()
+                for sink in self.sinks:
+                    sink.write(summary)
+            self.last_summary = time.monotonic()
+            self.pending = False
+
+    def summary(self) -> dict:
+        best = self.solution_pool.best_solution()
+        return {'time': time.time(),
+                'count': self.solution_pool.count,
+                'best_value': None if best is None else best.function_value,
+                'best_vector': None if best is None else np.asarray(best.vector).tolist(),
+                'current_value': self.latest.function_value,
+                'mean': self.solution_pool.mean,
+                'dropped': self.dropped}
+
+    def close(self):
+        self.stop()
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
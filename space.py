@@ -0,0 +1,137 @@
+import numpy as np
+
+from typing import List, Sequence, Tuple, Union
+
+
+class Bound:
+    """Границы одного параметра.
+
+    scale='log' - параметр меняется на порядки, в единичном кубе ему
+    соответствует логарифм; такие границы должны быть положительны.
+    """
+
+    SCALES = ('linear', 'log')
+
+    def __init__(self, low: float, high: float, scale: str = 'linear', name: str = None):
+        if scale not in self.SCALES:
+            raise ValueError(f'unknown scale {scale!r}, expected one of {self.SCALES}')
+        if not low < high:
+            raise ValueError(f'bound needs low < high, got ({low}, {high})')
+        if scale == 'log' and low <= 0:
+            raise ValueError(f'log scale needs positive bounds, got ({low}, {high})')
+
+        self.low = float(low)
+        self.high = float(high)
+        self.scale = scale
+        self.name = name
+
+    def __iter__(self):
+        # Чтобы Bound можно было распаковать как кортеж (low, high)
+        return iter((self.low, self.high))
+
+    def __repr__(self):
+        name = '' if self.name is None else f'{self.name}: '
+        return f'Bound({name}{self.low}, {self.high}, {self.scale})'
+
+
+BoundsLike = Union['ParameterSpace', Sequence[Union[Bound, Tuple[float, float]]]]
+
+
+def repair(vectors: np.ndarray, low: np.ndarray, high: np.ndarray, mode: str = 'clip') -> np.ndarray:
+    """Возвращает вылетевшие координаты в [low, high] для вектора или пакета векторов.
+
+    clip - на ближнюю границу, reflect - зеркально от границы, wrap - по
+    периодичности (для фаз и т.п.).
+    """
+    vectors = np.asarray(vectors, dtype=float)
+    if mode == 'clip':
+        return np.clip(vectors, low, high)
+
+    width = high - low
+    if mode == 'wrap':
+        return low + np.mod(vectors - low, width)
+    if mode == 'reflect':
+        # Период отражений - две ширины интервала
+        shifted = np.mod(vectors - low, 2 * width)
+        return low + np.where(shifted > width, 2 * width - shifted, shifted)
+    raise ValueError(f"unknown repair mode {mode!r}, expected 'clip', 'reflect' or 'wrap'")
+
+
+class ParameterSpace:
+    """Пространство поиска: границы всех параметров массивами и переход к единичному кубу.
+
+    Оптимизаторы двигаются в единичном кубе [0, 1]^d, где у всех параметров
+    одинаковый масштаб, и переводят точки в исходные координаты только для
+    вычисления цели. Все методы принимают как один вектор, так и пакет (n x d).
+    """
+
+    def __init__(self, bounds: Sequence[Union[Bound, Tuple[float, float]]], repair_mode: str = 'clip'):
+        self.bounds: List[Bound] = [bound if isinstance(bound, Bound) else Bound(*bound) for bound in bounds]
+        self.repair_mode = repair_mode
+
+        self.low = np.array([bound.low for bound in self.bounds])
+        self.high = np.array([bound.high for bound in self.bounds])
+        self.log = np.array([bound.scale == 'log' for bound in self.bounds])
+
+        # Линейные координаты куба считаются от low/high, логарифмические - от их логарифмов
+        self._low = np.where(self.log, np.log(np.where(self.log, self.low, 1.0)), self.low)
+        self._width = np.where(self.log, np.log(np.where(self.log, self.high, 1.0)), self.high) - self._low
+
+    @classmethod
+    def from_bounds(cls, bounds: BoundsLike, repair_mode: str = None) -> 'ParameterSpace':
+        if isinstance(bounds, ParameterSpace):
+            if repair_mode is None or repair_mode == bounds.repair_mode:
+                return bounds
+            return cls(bounds.bounds, repair_mode)
+        return cls(bounds, 'clip' if repair_mode is None else repair_mode)
+
+    @property
+    def dimension(self) -> int:
+        return len(self.bounds)
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def tuples(self) -> List[Tuple[float, float]]:
+        return [(bound.low, bound.high) for bound in self.bounds]
+
+    def to_unit(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=float)
+        if self.log.any():
+            vectors = np.where(self.log, np.log(np.maximum(vectors, self.low)), vectors)
+        return (vectors - self._low) / self._width
+
+    def from_unit(self, units) -> np.ndarray:
+        units = np.asarray(units, dtype=float)
+        vectors = self._low + units * self._width
+        if self.log.any():
+            # exp(log(low) + width) может выйти за high на ulp; считая от ближней
+            # границы, концы куба переходят точно в low и high
+            from_low = np.where(self.log, self.low, 1.0) * np.exp(units * self._width)
+            from_high = np.where(self.log, self.high, 1.0) * np.exp((units - 1) * self._width)
+            vectors = np.where(self.log, np.where(units > 0.5, from_high, from_low), vectors)
+        return vectors
+
+    def unit_jacobian(self, units) -> np.ndarray:
+        # d(вектор)/d(координата куба) покомпонентно; нужен для перевода градиентов в куб
+        jacobian = np.broadcast_to(self._width, np.shape(units)).astype(float)
+        if self.log.any():
+            jacobian = np.where(self.log, jacobian * self.from_unit(units), jacobian)
+        return jacobian
+
+    def repair(self, vectors, mode: str = None) -> np.ndarray:
+        return repair(vectors, self.low, self.high, mode or self.repair_mode)
+
+    def repair_unit(self, units, mode: str = None) -> np.ndarray:
+        return repair(units, 0.0, 1.0, mode or self.repair_mode)
+
+    def sample_unit(self, count: int) -> np.ndarray:
+        return np.random.uniform(0, 1, (count, self.dimension))
+
+    def sample(self, count: int) -> np.ndarray:
+        # Равномерно в кубе, то есть лог-равномерно для логарифмических параметров
+        return self.from_unit(self.sample_unit(count))
+
+    def contains(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=float)
+        return np.all((vectors >= self.low) & (vectors <= self.high), axis=-1)
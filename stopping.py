@@ -0,0 +1,132 @@
+import time
+
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import List, Optional
+
+from base import SolutionPool
+from metrics import Metrics
+
+
+class StoppingRule(ABC):
+    """Правило остановки, проверяемое после каждого раунда оптимизатора.
+
+    start() вызывается в начале запуска, check() возвращает причину
+    остановки строкой или None. Проверки берут готовые статистики пула и
+    счётчики метрик, поэтому стоят O(1). Правила объединяются через |.
+    """
+
+    def start(self, pool: SolutionPool, metrics: Metrics):
+        pass
+
+    @abstractmethod
+    def check(self, pool: SolutionPool, metrics: Metrics) -> Optional[str]:
+        pass
+
+    def __or__(self, other: 'StoppingRule') -> 'AnyOf':
+        return AnyOf(self, other)
+
+
+class AnyOf(StoppingRule):
+    def __init__(self, *rules: StoppingRule):
+        self.rules: List[StoppingRule] = []
+        for rule in rules:
+            self.rules.extend(rule.rules if isinstance(rule, AnyOf) else [rule])
+
+    def start(self, pool: SolutionPool, metrics: Metrics):
+        for rule in self.rules:
+            rule.start(pool, metrics)
+
+    def check(self, pool: SolutionPool, metrics: Metrics) -> Optional[str]:
+        for rule in self.rules:
+            reason = rule.check(pool, metrics)
+            if reason is not None:
+                return reason
+        return None
+
+
+class WallClock(StoppingRule):
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.start_time = time.monotonic()
+
+    def start(self, pool: SolutionPool, metrics: Metrics):
+        self.start_time = time.monotonic()
+
+    def check(self, pool: SolutionPool, metrics: Metrics) -> Optional[str]:
+        elapsed = time.monotonic() - self.start_time
+        if elapsed >= self.seconds:
+            return f'wall clock: {elapsed:.0f} s of {self.seconds:.0f} s'
+        return None
+
+
+class EvaluationBudget(StoppingRule):
+    # Считаются вычисления, запрошенные оптимизатором (включая попадания в кэш)
+    def __init__(self, evaluations: int):
+        self.evaluations = evaluations
+        self.start_evaluations = 0
+
+    def start(self, pool: SolutionPool, metrics: Metrics):
+        self.start_evaluations = metrics.counters['evaluations']
+
+    def check(self, pool: SolutionPool, metrics: Metrics) -> Optional[str]:
+        used = metrics.counters['evaluations'] - self.start_evaluations
+        if used >= self.evaluations:
+            return f'evaluation budget: {used} of {self.evaluations}'
+        return None
+
+
+class TargetValue(StoppingRule):
+    def __init__(self, value: float):
+        self.value = value
+
+    def check(self, pool: SolutionPool, metrics: Metrics) -> Optional[str]:
+        best = pool.best_value
+        if best is None:
+            return None
+        if (best <= self.value) if pool.minimization else (best >= self.value):
+            return f'target value reached: {best:.6g}'
+        return None
+
+
+class NoImprovement(StoppingRule):
+    """Остановка, если за window раундов лучшее значение улучшилось меньше чем на relative_tolerance."""
+
+    def __init__(self, window: int, relative_tolerance: float = 1e-3):
+        self.window = window
+        self.relative_tolerance = relative_tolerance
+        self.history = deque(maxlen=window + 1)
+
+    def start(self, pool: SolutionPool, metrics: Metrics):
+        self.history.clear()
+
+    def check(self, pool: SolutionPool, metrics: Metrics) -> Optional[str]:
+        best = pool.best_value
+        if best is None:
+            return None
+        self.history.append(best)
+        if len(self.history) <= self.window:
+            return None
+
+        old = self.history[0]
+        improvement = (old - best) if pool.minimization else (best - old)
+        if improvement <= self.relative_tolerance * max(abs(old), 1e-300):
+            return f'no improvement: {improvement:.3g} over {self.window} rounds'
+        return None
+
+
+class StopController:
+    """Связывает правило с оптимизатором: служит его stop_condition и запоминает причину."""
+
+    def __init__(self, rule: StoppingRule, pool: SolutionPool, metrics: Metrics):
+        self.rule = rule
+        self.pool = pool
+        self.metrics = metrics
+        self.reason: Optional[str] = None
+
+        self.rule.start(pool, metrics)
+
+    def __call__(self) -> bool:
+        if self.reason is None:
+            self.reason = self.rule.check(self.pool, self.metrics)
+        return self.reason is not None
@@ -0,0 +1,92 @@
+import os
+import pickle
+import threading
+import time
+
+from typing import Callable, Optional
+
+
+def write_checkpoint(path: str, state: dict):
+    # Временный файл + fsync + rename: на диске всегда целая контрольная точка
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def load_checkpoint(path: str) -> dict:
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+class Checkpointer:
+    """Периодическая запись контрольных точек оптимизации.
+
+    Оптимизатор после каждого раунда вызывает round_finished(). Раз в
+    interval секунд состояние снимается через state_function (это копии
+    массивов, снимок дешёвый), а сериализация и запись на диск идут в
+    фоновом потоке. Если прошлая запись ещё не закончилась, ждущий снимок
+    заменяется новым.
+    """
+
+    def __init__(self, path: str, state_function: Callable[[], dict], interval: float = 300.0):
+        self.path = path
+        self.state_function = state_function
+        self.interval = interval
+
+        self.last_save = time.monotonic()
+        self.saved = 0
+
+        self.pending: Optional[dict] = None
+        self.writing = False
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name='checkpointer', daemon=True)
+        self.thread.start()
+
+    def round_finished(self):
+        if time.monotonic() - self.last_save >= self.interval:
+            self.submit(self.state_function())
+
+    def submit(self, state: dict):
+        with self.condition:
+            self.pending = state
+            self.condition.notify()
+        self.last_save = time.monotonic()
+
+    def save(self):
+        # Немедленная синхронная запись, например в конце optimize
+        self.flush()
+        write_checkpoint(self.path, self.state_function())
+        self.saved += 1
+        self.last_save = time.monotonic()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                state, self.pending = self.pending, None
+                self.writing = True
+
+            write_checkpoint(self.path, state)
+
+            with self.condition:
+                self.writing = False
+                self.saved += 1
+                self.condition.notify_all()
+
+    def flush(self):
+        with self.condition:
+            while self.pending is not None or self.writing:
+                self.condition.wait()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
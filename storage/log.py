@@ -0,0 +1,124 @@
+import numpy as np
+
+import json
+import os
+import time
+
+from typing import Iterator, List, Optional
+
+
+def chunk_dtype(dimension: int) -> np.dtype:
+    return np.dtype([('value', 'f8'), ('timestamp', 'f8'), ('source', 'i4'), ('vector', 'f8', (dimension,))])
+
+
+class SolutionLog:
+    """Дописываемый журнал решений на диске.
+
+    Решения копятся в буфере и сбрасываются блоками в отдельные .npy файлы
+    chunk_XXXXXX.npy, после чего в index.jsonl дописывается строка о блоке.
+    Блок сначала пишется во временный файл и переименовывается, поэтому после
+    падения журнал содержит все блоки, упомянутые в индексе. Блоки читаются
+    через np.load(mmap_mode='r') без копирования.
+    """
+
+    INDEX_FILE = 'index.jsonl'
+
+    def __init__(self, path: str, chunk_size: int = 4096, flush_interval: float = 30.0):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+
+        os.makedirs(self.path, exist_ok=True)
+
+        self.dimension: Optional[int] = None
+        self.source_names: List[str] = []
+        self.entries: List[dict] = []
+
+        self.read_index()
+
+        self._buffer: List[np.ndarray] = []
+        self._buffered_rows = 0
+        self._last_flush = time.time()
+
+    def read_index(self):
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+
+        with open(index_path, 'rb') as file:
+            data = file.read()
+
+        valid_length = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                # Недописанная строка после падения
+                break
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            if not os.path.exists(os.path.join(self.path, entry['file'])):
+                break
+            self.entries.append(entry)
+            self.dimension = entry['dimension']
+            self.source_names = entry['source_names']
+            valid_length += len(line)
+
+        if valid_length < len(data):
+            # Иначе следующие строки допишутся за обрывком и потеряются при чтении
+            with open(index_path, 'r+b') as file:
+                file.truncate(valid_length)
+
+    @property
+    def rows(self) -> int:
+        return sum(entry['rows'] for entry in self.entries) + self._buffered_rows
+
+    def append(self, vectors, values, timestamps, source_ids, source_names: List[str]):
+        vectors = np.asarray(vectors, dtype=float)
+
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+
+        block = np.empty(len(values), dtype=chunk_dtype(self.dimension))
+        block['value'] = values
+        block['timestamp'] = timestamps
+        block['source'] = source_ids
+        block['vector'] = vectors
+
+        self._buffer.append(block)
+        self._buffered_rows += len(block)
+        self.source_names = list(source_names)
+
+        if self._buffered_rows >= self.chunk_size or time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.time()
+        if self._buffered_rows == 0:
+            return
+
+        block = np.concatenate(self._buffer)
+        self._buffer = []
+        self._buffered_rows = 0
+
+        name = f'chunk_{len(self.entries):06d}.npy'
+        temporary_path = os.path.join(self.path, name + '.tmp')
+        with open(temporary_path, 'wb') as file:
+            np.save(file, block)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, os.path.join(self.path, name))
+
+        entry = {'file': name, 'rows': len(block), 'dimension': self.dimension, 'source_names': self.source_names}
+        with open(os.path.join(self.path, self.INDEX_FILE), 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self.entries.append(entry)
+
+    def close(self):
+        self.flush()
+
+    def chunks(self) -> Iterator[np.ndarray]:
+        for entry in self.entries:
+            yield np.load(os.path.join(self.path, entry['file']), mmap_mode='r')
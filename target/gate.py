@@ -1,23 +1,39 @@
 import rydopt as ro
-#import numpy as np
+import numpy as np
 import jax
 import jax.numpy as jnp
-import matplotlib.pyplot as plt
 from rydopt.types import HamiltonianFunction
 import copy
 import time
-import os
-os.environ["JAX_PLATFORMS"] = "cuda"
 
-# 2. Узнать платформу первого устройства (CPU, GPU, TPU)
-print("Платформа по умолчанию:", jax.devices()[0].platform)
+from typing import Optional
 
-# 3. Более подробная информация о локальных устройствах (особенно полезно для multi-GPU)
-print("Локальные устройства:", jax.local_devices())
+from space import Bound
+# Раньше жили здесь; драйвер берёт их из target.jax_config, не загружая rydopt
+from target.jax_config import configure_platform, enable_compilation_cache
+
+
+def describe_devices():
+    # Платформа первого устройства (CPU, GPU, TPU) и все локальные устройства
+    print("Платформа по умолчанию:", jax.devices()[0].platform)
+    print("Локальные устройства:", jax.local_devices())
 
 
 # %%
 class CZGateThreePhotonLevine:
+    """CZ гейт на трёхфотонном возбуждении по схеме Levine.
+
+    Гамильтониан каждого базисного состояния раскладывается на постоянные
+    матрицы, которые строятся один раз в конструкторе:
+
+        H(t) = H0 + Δ·Hd + c·Hc + c̄·Hcᵀ + Vnn·Hv,    c = Ω·e^{-iξ}
+
+    H0 - связи Omega2, Omega3 и распады, Hd - диагональ при отстройке, Hc -
+    верхнетреугольная связь первого перехода (Omega1 = Omega2/Omega3·c),
+    Hv - взаимодействие rr. Vnn входит только коэффициентом, поэтому может
+    быть трассируемым значением JAX. perturbed() даёт копию с ошибками
+    амплитуды Раби, отстройки и Vnn для ансамблей робастности.
+    """
 
     def __init__(self, Omega2: float, Omega3: float, Vnn: float, DecayP: float, DecayS: float, DecayR: float):
         self._Omega2 = Omega2
@@ -27,68 +43,99 @@ class CZGateThreePhotonLevine:
         self._DecayS = DecayS
         self._DecayR = DecayR
 
+        # Ошибки управления: множитель амплитуды Раби и сдвиг отстройки
+        self._rabi_scale = 1.0
+        self._detuning_offset = 0.0
+
+        self._structures = (self.single_atom_structure(), self.two_atom_structure())
+
+    def perturbed(self, rabi_scale=1.0, detuning_offset=0.0, vnn_scale=1.0) -> 'CZGateThreePhotonLevine':
+        # Матрицы общие с исходным гейтом, меняются только коэффициенты; значения могут быть трассируемыми
+        gate = copy.copy(self)
+        gate._rabi_scale = self._rabi_scale * rabi_scale
+        gate._detuning_offset = self._detuning_offset + detuning_offset
+        gate._Vnn = self._Vnn * vnn_scale
+        return gate
+
+    def single_atom_structure(self):
+        """single-atom excitation with states 01,0p,0s,0r"""
+        k = self._Omega2 / self._Omega3
+
+        H0 = np.zeros((4, 4), dtype=complex)
+        H0[1, 1] = -0.5j * self._DecayP
+        H0[2, 2] = -0.5j * self._DecayS
+        H0[3, 3] = -0.5j * self._DecayR
+        H0[1, 2] = H0[2, 1] = 0.5 * self._Omega2
+        H0[2, 3] = H0[3, 2] = 0.5 * self._Omega3
+
+        Hd = np.zeros(4)
+        Hd[3] = 1
+
+        Hc = np.zeros((4, 4))
+        Hc[0, 1] = 0.5 * k
+
+        Hv = np.zeros(4)
+
+        return H0, Hd, Hc, Hv
+
+    def two_atom_structure(self):
+        """
+        11 - 1p+p1 - 1s+s1, 1r+r1,
+        11 - 1p+p1 - pp - ps+sp - ss - sr+rs - rr
+        11 - 1p+p1 - 1r+r1 - pr+rp - sr+rs - rr
+        two-atom excitation with states 11,1p+p1,1s+s1, 1r+r1, pp, ps+sp, pr+rp, ss, sr+rs, rr
+        """
+        k = self._Omega2 / self._Omega3
+        sqrt2 = np.sqrt(2)
+        DecayP, DecayS, DecayR = self._DecayP, self._DecayS, self._DecayR
+
+        H0 = np.zeros((10, 10), dtype=complex)
+        H0[np.diag_indices(10)] = -1j * np.array([0, 0.5 * DecayP, 0.5 * DecayS, 0.5 * DecayR, DecayP,
+                                                  0.5 * (DecayP + DecayS), 0.5 * (DecayP + DecayR), DecayS,
+                                                  0.5 * (DecayS + DecayR), DecayR])
+        couplings = [(1, 2, 0.5 * self._Omega2), (2, 3, 0.5 * self._Omega3),
+                     (4, 5, 0.5 * sqrt2 * self._Omega2), (5, 6, 0.5 * self._Omega3),
+                     (5, 7, 0.5 * sqrt2 * self._Omega2), (6, 8, 0.5 * self._Omega2),
+                     (7, 8, 0.5 * sqrt2 * self._Omega3), (8, 9, 0.5 * sqrt2 * self._Omega3)]
+        for i, j, value in couplings:
+            H0[i, j] = H0[j, i] = value
+
+        Hd = np.zeros(10)
+        Hd[[3, 6, 8]] = 1
+        Hd[9] = 2
+
+        Hc = np.zeros((10, 10))
+        Hc[0, 1] = 0.5 * sqrt2 * k
+        Hc[1, 4] = 0.5 * sqrt2 * k
+        Hc[2, 5] = 0.5 * k
+        Hc[3, 6] = 0.5 * k
+
+        Hv = np.zeros(10)
+        Hv[9] = 1
+
+        return H0, Hd, Hc, Hv
+
     def initial_basis_states(self) -> tuple[jnp.ndarray, ...]:
         return jnp.array([1, 0, 0, 0], dtype=complex), jnp.array([1, 0, 0, 0, 0, 0, 0, 0, 0, 0], dtype=complex)
 
+    def make_hamiltonian(self, structure) -> HamiltonianFunction:
+        H0, Hd, Hc, Hv = structure
+        # Все матрицы готовы заранее: на каждый вызов решателя остаются умножения на скаляры и сложения
+        H0 = jnp.asarray(H0)
+        Hd = jnp.asarray(np.diag(Hd))
+        Hv = jnp.asarray(np.diag(Hv))
+        Hc = jnp.asarray(Hc)
+        HcT = Hc.T
+
+        def hamiltonian(Delta: float, Xi: float, Omega: float) -> jnp.ndarray:
+            c = self._rabi_scale * Omega * jnp.exp(-1j * Xi)
+            Delta = Delta + self._detuning_offset
+            return H0 + Delta * Hd + self._Vnn * Hv + c * Hc + jnp.conj(c) * HcT
+
+        return hamiltonian
+
     def hamiltonian_functions_for_basis_states(self) -> tuple[HamiltonianFunction, ...]:
-        def hamiltonian1(Delta: float, Xi: float, Omega: float) -> jnp.ndarray:
-            """single-atom excitation with states 01,0p,0s,0r"""
-
-            DecayP = self._DecayP
-            DecayS = self._DecayS
-            DecayR = self._DecayR
-            Omega2 = self._Omega2
-            Omega3 = self._Omega3
-
-            Omega1 = Omega2 * (Omega * jnp.exp(-1j * Xi)) / Omega3
-            Omega1C = Omega2 * (Omega * jnp.exp(1j * Xi)) / Omega3
-            return jnp.array(
-                [
-                    [0, Omega1 * 0.5, 0, 0],
-                    [Omega1C * 0.5, -0.5 * 1j * DecayP, Omega2 * 0.5, 0],
-                    [0, Omega2 * 0.5, -0.5 * 1j * DecayS, Omega3 * 0.5],
-                    [0, 0, Omega3 * 0.5, Delta - 0.5 * 1j * DecayR]
-
-                ]
-            )
-
-        def hamiltonian2(Delta: float, Xi: float, Omega: float) -> jnp.ndarray:
-            """
-            11 - 1p+p1 - 1s+s1, 1r+r1,
-            11 - 1p+p1 - pp - ps+sp - ss - sr+rs - rr
-            11 - 1p+p1 - 1r+r1 - pr+rp - sr+rs - rr
-            two-atom excitation with states 11,1p+p1,1s+s1, 1r+r1, pp, ps+sp, pr+rp, ss, sr+rs, rr
-            """
-            DecayP = self._DecayP
-            DecayS = self._DecayS
-            DecayR = self._DecayR
-            Omega2 = self._Omega2
-            Omega3 = self._Omega3
-            Vnn = self._Vnn
-
-            Omega1 = Omega2 * (Omega * jnp.exp(-1j * Xi)) / Omega3
-            Omega1C = Omega2 * (Omega * jnp.exp(1j * Xi)) / Omega3
-
-            return jnp.array(
-                [
-                    [0, Omega1 * 0.5 * jnp.sqrt(2), 0, 0, 0, 0, 0, 0, 0, 0],  # 11
-                    [Omega1C * 0.5 * jnp.sqrt(2), -0.5 * 1j * DecayP, Omega2 * 0.5, 0, Omega1 * 0.5 * jnp.sqrt(2), 0, 0,
-                     0, 0, 0],  # 1p+p1
-                    [0, Omega2 * 0.5, -0.5 * 1j * DecayS, Omega3 * 0.5, 0, 0.5 * Omega1, 0, 0, 0, 0],  # 1s+s1
-                    [0, 0, Omega3 * 0.5, Delta - 0.5 * 1j * DecayR, 0, 0, 0.5 * Omega1, 0, 0, 0],  # 1r+r1
-                    [0, Omega1C * 0.5 * jnp.sqrt(2), 0, 0, -1j * DecayP, Omega2 * 0.5 * jnp.sqrt(2), 0, 0, 0, 0],  # pp
-                    [0, 0, 0.5 * Omega1C, 0, Omega2 * 0.5 * jnp.sqrt(2), -0.5 * 1j * (DecayP + DecayS), Omega3 * 0.5,
-                     Omega2 * 0.5 * jnp.sqrt(2), 0, 0],  # ps+sp
-                    [0, 0, 0, 0.5 * Omega1C, 0, Omega3 * 0.5, Delta - 0.5 * 1j * (DecayP + DecayR), 0, Omega2 * 0.5, 0],
-                    # pr+rp
-                    [0, 0, 0, 0, 0, Omega2 * 0.5 * jnp.sqrt(2), 0, -1j * DecayS, Omega3 * 0.5 * jnp.sqrt(2), 0],  # ss
-                    [0, 0, 0, 0, 0, 0, Omega2 * 0.5, Omega3 * 0.5 * jnp.sqrt(2), Delta - 1j * 0.5 * (DecayS + DecayR),
-                     Omega3 * 0.5 * jnp.sqrt(2)],  # sr+rs
-                    [0, 0, 0, 0, 0, 0, 0, 0, Omega3 * 0.5 * jnp.sqrt(2), 2 * Delta + Vnn - 1j * DecayR]  # rr
-                ]
-            )
-
-        return hamiltonian1, hamiltonian2
+        return tuple(self.make_hamiltonian(structure) for structure in self._structures)
 
     def process_fidelity(
             self, final_basis_states: tuple[jnp.ndarray, ...]
@@ -130,7 +177,8 @@ def split(params):
         elif isinstance(item, (list, jnp.ndarray)):
             vector.extend(item)
             sizes.append(len(item))
-    return jnp.array(vector), sizes
+    # numpy, а не jnp: split вызывается при импорте и не должен инициализировать JAX
+    return np.array(vector), sizes
 
 
 def assemble(vector, sizes):
@@ -143,83 +191,226 @@ def assemble(vector, sizes):
     return tuple(params)
 
 
-# %%
-params = (15.560089695727132,
-          [-0.66202403],
-          [0.51990003, -0.2527502, 0.8859972, -1.17347235, -0.08802893,
-           -0.327713, -1.00445164, 0.10583959, 1.20175343, 0.62878523,
-           0.65908966, -0.25679209, -0.56651597, 1.10736928, -0.32141791,
-           0.14352779, -0.2186016],
-          [1])
-# params_new = assemble(vector_val, structure_val)
-vector_val, structure_val = split(params)
-
-params_new = assemble(vector_val, structure_val)
-
-params_new
-# при применении assemble тип меняется, наверное, в этом проблема
-
 # %%
 lifetime80 = 260.3716142904322
 lifetime5p = 26e-3
 lifetime7s = 88e-3
 
-Omega2 = 2 * jnp.pi * 5000
-Omega3 = jnp.sqrt(Omega2 * 2 * 1 * jnp.pi)
-gate = CZGateThreePhotonLevine(Omega2, Omega3, 10000, 0 / lifetime5p / 10, 0 / lifetime7s / 10, 0 / lifetime80 / 10)
+Omega2 = 2 * np.pi * 5000
+Omega3 = float(np.sqrt(Omega2 * 2 * 1 * np.pi))
 
-vector_val, structure_val = split(params)
+GATE_PARAMS = (Omega2, Omega3, 10000, 0 / lifetime5p / 10, 0 / lifetime7s / 10, 0 / lifetime80 / 10)
 
+# Относительный сдвиг амплитуды Раби для проверки робастности
+RABI_SHIFT = 1.005
 
-def loss(vector, structure):
-    start = time.time()
-    lifetime80 = 260.3716142904322
-    lifetime5p = 26e-3
-    lifetime7s = 88e-3
 
-    Omega2 = 2 * jnp.pi * 5000
-    Omega3 = jnp.sqrt(Omega2 * 2 * 1 * jnp.pi)
-    gate = CZGateThreePhotonLevine(Omega2, Omega3, 10000, 0 / lifetime5p / 10, 0 / lifetime7s / 10, 0 / lifetime80 / 10)
-    params = assemble(vector, structure)
-    params_shift = copy.deepcopy(params)
+def build_pulse_ansatz():
+    return ro.pulses.PulseAnsatz(
+        detuning_ansatz=ro.pulses.const,
+        phase_ansatz=ro.pulses.lin_sin_cos_crab,
+        rabi_ansatz=ro.pulses.const
+    )
 
-    # Изменяем Omega (параметр Раби)
-    params_shift[3][0] = params[3][0] * 1.005
 
-    # Извлекаем значения из списков
-    duration = params[0][0]                  # длительность (число)
-    duration_shift = params_shift[0][0]
+def assemble_jax(vector, structure):
+    # То же, что assemble, но без перехода в списки, чтобы работать внутри jit
+    params = []
+    pos = 0
+    for size in structure:
+        params.append(vector[pos:pos + size])
+        pos += size
+    return tuple(params)
 
-    # Параметры детьюнинга (константа) – Xi, массив из одного элемента
-    detuning_params = jnp.array(params[1])
-    detuning_params_shift = jnp.array(params_shift[1])
 
-    # Параметры фазы (lin_sin_cos_crab) – коэффициенты, массив из 17 элементов
-    phase_params = jnp.array(params[2])
-    phase_params_shift = jnp.array(params_shift[2])
+class RobustnessEnsemble:
+    """Ансамбль ошибок управления для робастной функции потерь.
 
-    # Параметры Раби (константа) – Omega, массив из одного элемента
-    rabi_params = jnp.array(params[3])
-    rabi_params_shift = jnp.array(params_shift[3])
+    Каждый член задаёт множитель амплитуды Раби, сдвиг отстройки, множитель
+    Vnn и вес; потеря - взвешенная сумма неточностей по членам ансамбля.
+    """
+
+    def __init__(self, rabi_scales, detuning_offsets=None, vnn_scales=None, weights=None):
+        self.rabi_scales = np.asarray(rabi_scales, dtype=float)
+        size = len(self.rabi_scales)
+        self.detuning_offsets = np.zeros(size) if detuning_offsets is None else np.asarray(detuning_offsets, float)
+        self.vnn_scales = np.ones(size) if vnn_scales is None else np.asarray(vnn_scales, dtype=float)
+        self.weights = np.ones(size) if weights is None else np.asarray(weights, dtype=float)
+
+        if not (len(self.detuning_offsets) == len(self.vnn_scales) == len(self.weights) == size):
+            raise ValueError('ensemble arrays must have the same length')
+
+    @classmethod
+    def default(cls, rabi_shift: float = RABI_SHIFT) -> 'RobustnessEnsemble':
+        # Номинальный гейт и сдвиг амплитуды Раби - прежняя функция потерь
+        return cls([1.0, rabi_shift])
+
+    @classmethod
+    def grid(cls, rabi_deltas=(0.0,), detuning_offsets=(0.0,), vnn_scales=(1.0,),
+             total_weight: float = 1.0) -> 'RobustnessEnsemble':
+        """Все сочетания ошибок с равными весами, например grid((-0.005, 0, 0.005), (-1, 0, 1))."""
+        rabi, detuning, vnn = np.meshgrid(1.0 + np.asarray(rabi_deltas, dtype=float),
+                                          np.asarray(detuning_offsets, dtype=float),
+                                          np.asarray(vnn_scales, dtype=float), indexing='ij')
+        size = rabi.size
+        return cls(rabi.ravel(), detuning.ravel(), vnn.ravel(), np.full(size, total_weight / size))
+
+    @property
+    def size(self) -> int:
+        return len(self.weights)
+
+    def key(self) -> tuple:
+        return tuple(tuple(array.tolist()) for array in
+                     (self.rabi_scales, self.detuning_offsets, self.vnn_scales, self.weights))
+
+
+class GateLoss:
+    """Функция потерь гейта, скомпилированная для одной конфигурации.
+
+    Гейт и анзац строятся один раз. Члены ансамбля робастности (по умолчанию
+    номинальный гейт и сдвиг Раби на rabi_shift) считаются одной
+    векторизованной (vmap) симуляцией внутри jit-ядра. Экземпляр вызывается
+    как обычная целевая функция.
+    """
+
+    def __init__(self, structure, gate_params=GATE_PARAMS, rabi_shift: float = RABI_SHIFT,
+                 ensemble: Optional[RobustnessEnsemble] = None):
+        self.structure = tuple(int(size) for size in structure)
+        self.gate_params = tuple(float(param) for param in gate_params)
+        self.rabi_shift = rabi_shift
+        self.ensemble = RobustnessEnsemble.default(rabi_shift) if ensemble is None else ensemble
+
+        self.gate = CZGateThreePhotonLevine(*self.gate_params)
+        self.pulse_ansatz = build_pulse_ansatz()
+
+        self.__name__ = 'gate_loss'
+
+        self._loss = jax.jit(self.infidelity)
+        self._loss_batch = jax.jit(jax.vmap(self.infidelity))
+        self._loss_value_and_grad = jax.jit(jax.value_and_grad(self.infidelity))
+        self._functions = {'loss': self._loss, 'batch': self._loss_batch, 'value_and_grad': self._loss_value_and_grad}
+
+        # Первый вызов jit-функции для новой формы входа включает компиляцию
+        self._compiled_signatures = set()
+        self.timings = {'compile': [0, 0.0], 'execute': [0, 0.0]}
+
+        # (имя, форма входа) -> программа, скомпилированная заранее в warm_up
+        self._executables = {}
+
+    @property
+    def cache_namespace(self) -> str:
+        # Для EvaluationCache: значения разных конфигураций гейта не смешиваются
+        return repr((self.gate_params, self.structure, self.ensemble.key()))
+
+    def split_params(self, vector):
+        duration, detuning_params, phase_params, rabi_params = assemble_jax(vector, self.structure)
+        return duration[0], detuning_params, phase_params, rabi_params
+
+    def member_infidelity(self, params_jax, rabi_scale, detuning_offset, vnn_scale):
+        gate = self.gate.perturbed(rabi_scale, detuning_offset, vnn_scale)
+        time_evolved_basis_states = ro.simulation.evolve(gate, self.pulse_ansatz, params_jax)
+        return 1 - gate.process_fidelity(time_evolved_basis_states)
+
+    def infidelity(self, vector):
+        params_jax = self.split_params(vector)
+
+        infidelities = jax.vmap(self.member_infidelity, in_axes=(None, 0, 0, 0))(
+            params_jax, jnp.asarray(self.ensemble.rabi_scales), jnp.asarray(self.ensemble.detuning_offsets),
+            jnp.asarray(self.ensemble.vnn_scales))
+
+        return jnp.dot(jnp.asarray(self.ensemble.weights), infidelities)
+
+    @property
+    def dimension(self) -> int:
+        return sum(self.structure)
+
+    def default_bounds(self, duration=(5.0, 30.0), coefficients=(-2.0, 2.0), rabi=(0.1, 1.0)):
+        # Длительность порядка 15, коэффициенты CRAB и отстройка порядка 1, амплитуда Раби не больше 1
+        names = ('duration', 'detuning', 'phase', 'rabi')
+        ranges = (duration, coefficients, coefficients, rabi)
+        return [Bound(*ranges[group], name=f'{names[group]}[{i}]')
+                for group, size in enumerate(self.structure) for i in range(size)]
+
+    def warm_up(self, batch_sizes=(), single: bool = True, gradient: bool = True) -> dict:
+        """Компилирует функции заранее (AOT) для одиночного вектора, градиента и пакетов batch_sizes.
+
+        Возвращает время компиляции по сигнатурам. С включённым
+        enable_compilation_cache повторный запуск берёт программы с диска.
+        """
+        signatures = []
+        if single:
+            signatures.append(('loss', (self.dimension,)))
+        if gradient:
+            signatures.append(('value_and_grad', (self.dimension,)))
+        for batch_size in batch_sizes:
+            signatures.append(('batch', (int(batch_size), self.dimension)))
+
+        report = {}
+        for name, shape in signatures:
+            if (name, shape) in self._executables:
+                continue
+            start = time.perf_counter()
+            argument = jax.ShapeDtypeStruct(shape, jnp.float64)
+            self._executables[(name, shape)] = self._functions[name].lower(argument).compile()
+            elapsed = time.perf_counter() - start
+
+            self._compiled_signatures.add((name, shape))
+            self.timings['compile'][0] += 1
+            self.timings['compile'][1] += elapsed
+            report[f'{name}{shape}'] = elapsed
+        return report
+
+    def timed_call(self, name, function, argument):
+        signature = (name, argument.shape)
+        function = self._executables.get(signature, function)
+        start = time.perf_counter()
+        result = jax.block_until_ready(function(argument))
+        phase = 'execute' if signature in self._compiled_signatures else 'compile'
+        self._compiled_signatures.add(signature)
+        self.timings[phase][0] += 1
+        self.timings[phase][1] += time.perf_counter() - start
+        return result
+
+    def stats(self) -> dict:
+        return {'compile_calls': self.timings['compile'][0], 'compile_time': self.timings['compile'][1],
+                'execute_calls': self.timings['execute'][0], 'execute_time': self.timings['execute'][1]}
+
+    def __call__(self, vector) -> float:
+        return float(self.timed_call('loss', self._loss, jnp.asarray(vector, dtype=jnp.float64)))
+
+    def batch(self, matrix) -> np.ndarray:
+        # Строки матрицы - векторы параметров, считаются одним векторизованным решением
+        values = self.timed_call('batch', self._loss_batch, jnp.asarray(matrix, dtype=jnp.float64))
+        return np.asarray(values, dtype=float)
+
+    def value_and_grad(self, vector):
+        # Значение и точный градиент за один скомпилированный вызов
+        value, gradient = self.timed_call('value_and_grad', self._loss_value_and_grad,
+                                          jnp.asarray(vector, dtype=jnp.float64))
+        return float(value), np.asarray(gradient, dtype=float)
+
+
+_gate_losses = {}
+
+
+def get_gate_loss(structure, gate_params=GATE_PARAMS, ensemble: Optional[RobustnessEnsemble] = None) -> GateLoss:
+    key = (tuple(float(param) for param in gate_params), tuple(int(size) for size in structure),
+           None if ensemble is None else ensemble.key())
+    if key not in _gate_losses:
+        _gate_losses[key] = GateLoss(structure, gate_params, ensemble=ensemble)
+    return _gate_losses[key]
 
-    # Кортеж из 4 элементов
-    params_jax = (duration, detuning_params, phase_params, rabi_params)
-    params_shift_jax = (duration_shift, detuning_params_shift, phase_params_shift, rabi_params_shift)
 
-    pulse_ansatz = ro.pulses.PulseAnsatz(
-        detuning_ansatz=ro.pulses.const,
-        phase_ansatz=ro.pulses.lin_sin_cos_crab,
-        rabi_ansatz=ro.pulses.const
-    )
+def loss(vector, structure):
+    return get_gate_loss(structure)(vector)
+
 
-    time_evolved_basis_states = ro.simulation.evolve(gate, pulse_ansatz, params_jax)
-    time_evolved_basis_states_shift = ro.simulation.evolve(gate, pulse_ansatz, params_shift_jax)
-    print('\n')
-    print('TIME',time.time() - start )
-    print('\n')
+def loss_batch(matrix, structure) -> np.ndarray:
+    return get_gate_loss(structure).batch(matrix)
 
-    return ((1 - gate.process_fidelity(time_evolved_basis_states)) + \
-           (1 - gate.process_fidelity(time_evolved_basis_states_shift))).item()
+
+def loss_value_and_grad(vector, structure):
+    return get_gate_loss(structure).value_and_grad(vector)
 
 
 # %%
@@ -231,5 +422,13 @@ params = (15.560089695727132,
            0.14352779, -0.2186016],
           [1])
 vector_val, structure_val = split(params)
+
+
+def default_gate_loss() -> GateLoss:
+    # Потери для эталонной структуры параметров; строится только при вызове
+    return get_gate_loss(structure_val)
+
+
 if __name__ == '__main__':
-    print(loss(vector_val, structure_val))
\ No newline at end of file
+    describe_devices()
+    print(loss(vector_val, structure_val))
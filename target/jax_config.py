@@ -0,0 +1,50 @@
+"""Настройки JAX, которые нужно применить до загрузки модели гейта.
+
+Модуль не импортирует rydopt (а через него diffrax и equinox), поэтому
+драйвер может вызвать эти функции раньше, чем будет построена цель.
+"""
+import os
+import sys
+import warnings
+
+
+def configure_platform(platform: str):
+    """Выбор устройства ('cpu', 'cuda', ...); работает только до первого вычисления JAX.
+
+    Значение дублируется в JAX_PLATFORMS, чтобы его унаследовали процессы
+    пула и острова (spawn импортирует JAX заново).
+    """
+    import jax
+
+    os.environ['JAX_PLATFORMS'] = platform
+    jax.config.update('jax_platforms', platform)
+
+
+def enable_compilation_cache(path: str, min_compile_time: float = 0.0, nan_on_solver_error: bool = False):
+    """Включает постоянный кэш скомпилированных XLA-программ в каталоге path.
+
+    Новый процесс с той же конфигурацией гейта берёт программу с диска
+    вместо компиляции. Значения дублируются в переменные окружения, чтобы их
+    унаследовали процессы пула (spawn импортирует JAX заново).
+
+    diffrax проверяет ошибки решателя (например, max_steps) через host
+    callback, а программы с callback JAX на диск не пишет. С
+    nan_on_solver_error=True (EQX_ON_ERROR=nan) проверка убирается из
+    программы и она кэшируется, но при сбое решателя потеря становится NaN
+    вместо исключения. Включать до импорта target.gate.
+    """
+    import jax
+
+    os.makedirs(path, exist_ok=True)
+    os.environ['JAX_COMPILATION_CACHE_DIR'] = path
+    os.environ['JAX_PERSISTENT_CACHE_MIN_COMPILE_TIME_SECS'] = str(min_compile_time)
+    jax.config.update('jax_compilation_cache_dir', path)
+    jax.config.update('jax_persistent_cache_min_compile_time_secs', min_compile_time)
+
+    if nan_on_solver_error:
+        if 'equinox' in sys.modules and os.environ.get('EQX_ON_ERROR') != 'nan':
+            raise RuntimeError('nan_on_solver_error must be set before target.gate is imported')
+        os.environ['EQX_ON_ERROR'] = 'nan'
+    elif os.environ.get('EQX_ON_ERROR', 'raise') == 'raise':
+        warnings.warn('the gate simulation uses host callbacks for solver errors and will not be stored '
+                      'in the compilation cache; pass nan_on_solver_error=True to cache it')
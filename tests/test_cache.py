@@ -0,0 +1,90 @@
+import numpy as np
+
+from base import BaseEvaluator, SerialEvaluator
+from evaluators.cache import EvaluationCache
+
+
+class RecordingEvaluator(BaseEvaluator):
+    # Запоминает размеры пакетов, как их увидела бы jit-цель
+    def __init__(self, shape_sensitive: bool = False):
+        self.shape_sensitive = shape_sensitive
+        self.batch_sizes = []
+
+    def evaluate(self, vectors) -> np.ndarray:
+        self.batch_sizes.append(len(vectors))
+        return np.array([float(np.sum(vector)) for vector in vectors])
+
+
+def test_hit_miss_accounting():
+    cache = EvaluationCache()
+    evaluator = RecordingEvaluator()
+
+    values = cache.evaluate([[1.0, 2.0], [3.0, 4.0], [1.0, 2.0]], evaluator)
+    np.testing.assert_array_equal(values, [3.0, 7.0, 3.0])
+    # Повтор внутри пакета считается один раз
+    assert evaluator.batch_sizes == [2]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    values = cache.evaluate([[3.0, 4.0], [5.0, 6.0]], evaluator)
+    np.testing.assert_array_equal(values, [7.0, 11.0])
+    assert evaluator.batch_sizes == [2, 1]
+    assert (cache.hits, cache.misses) == (2, 3)
+    assert cache.stats()['hit_rate'] == 2 / 5
+
+
+def test_lru_eviction():
+    cache = EvaluationCache(max_size=2)
+    evaluator = RecordingEvaluator()
+
+    cache.evaluate([[1.0], [2.0]], evaluator)
+    # Обращение к [1.0] делает вытесняемым [2.0]
+    cache.evaluate([[1.0]], evaluator)
+    cache.evaluate([[3.0]], evaluator)
+    assert cache.evictions == 1
+    assert cache.get(cache.key([2.0])) is None
+    assert cache.get(cache.key([1.0])) == 1.0
+    assert cache.get(cache.key([3.0])) == 3.0
+
+
+def test_sqlite_round_trip(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    calls = []
+
+    def target(vector):
+        calls.append(vector)
+        return np.nan if vector[0] < 0 else float(vector[0] ** 2)
+
+    cache = EvaluationCache(path=path, namespace='square')
+    first = cache.evaluate([[2.0], [-1.0]], SerialEvaluator(target))
+    cache.close()
+
+    cache = EvaluationCache(path=path, namespace='square')
+    second = cache.evaluate([[2.0], [-1.0]], SerialEvaluator(target))
+    np.testing.assert_array_equal(first, second)
+    assert np.isnan(second[1])
+    assert len(calls) == 2
+    assert cache.store_hits == 2
+    cache.close()
+
+    # Другая конфигурация не видит чужих значений
+    cache = EvaluationCache(path=path, namespace='other')
+    cache.evaluate([[2.0]], SerialEvaluator(target))
+    assert len(calls) == 3
+    cache.close()
+
+
+def test_misses_padded_for_shape_sensitive_evaluator():
+    cache = EvaluationCache()
+    evaluator = RecordingEvaluator(shape_sensitive=True)
+    batch = np.arange(16, dtype=float).reshape(8, 2)
+
+    cache.evaluate(batch, evaluator)
+    values = cache.evaluate(np.vstack([batch[:5], [[100.0, 0.0]] * 3 + np.arange(3)[:, None]]), evaluator)
+    np.testing.assert_array_equal(values[5:], [100.0, 102.0, 104.0])
+    # 3 промаха дополняются до 4, полный пакет не дополняется
+    assert evaluator.batch_sizes == [8, 4]
+    assert cache.misses == 11
+
+    serial = RecordingEvaluator()
+    cache.evaluate(np.vstack([batch[:5], [[200.0, 0.0]] * 3 + np.arange(3)[:, None]]), serial)
+    assert serial.batch_sizes == [3]
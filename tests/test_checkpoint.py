@@ -0,0 +1,47 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from optimizers.gradient import AdamWL2Optimizer
+from optimizers.swarm import SwarmOptimizer
+from process import OptimizationProcess
+from storage.checkpoint import load_checkpoint
+from target.test import vector_quadratic_sum
+
+
+BOUNDS = [(-5.0, 5.0)] * 4
+
+
+def make_process(optimizer, kwargs) -> OptimizationProcess:
+    return OptimizationProcess(vector_quadratic_sum, optimizer, BOUNDS, True, None, optimizer_kwargs=kwargs, sinks=[])
+
+
+@pytest.mark.parametrize('optimizer, kwargs', [(SwarmOptimizer, {'swarm_size': 16}), (AdamWL2Optimizer, {})])
+def test_resume_continues_bit_for_bit(tmp_path, optimizer, kwargs):
+    path = str(tmp_path / 'state.ckpt')
+    saved = str(tmp_path / 'after_first_run.ckpt')
+
+    np.random.seed(0)
+    process = make_process(optimizer, kwargs)
+    process.enable_checkpoints(path, interval=1e9)
+    process.optimize(5)
+    # optimize пишет контрольную точку в конце; следующий вызов её перезапишет
+    shutil.copy(path, saved)
+    start = process.solutions_pool.count
+    process.optimize(5)
+    expected_values = process.solutions_pool.values[start:].copy()
+    expected_vectors = process.solutions_pool.vectors[start:].copy()
+    process.close()
+
+    # Другое зерно: всё нужное для продолжения должно прийти из контрольной точки
+    np.random.seed(123)
+    resumed = make_process(optimizer, kwargs)
+    resumed.resume(saved, iterations=5)
+    restored = len(load_checkpoint(saved)['best_values'])
+    values = resumed.solutions_pool.values[restored:].copy()
+    vectors = resumed.solutions_pool.vectors[restored:].copy()
+    resumed.close()
+
+    np.testing.assert_array_equal(values, expected_values)
+    np.testing.assert_array_equal(vectors, expected_vectors)
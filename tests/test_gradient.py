@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from optimizers.gradient import AdamWL2Optimizer
+from process import OptimizationProcess
+from target.test import vector_quadratic_sum
+
+
+def make_process(**kwargs) -> OptimizationProcess:
+    np.random.seed(0)
+    return OptimizationProcess(vector_quadratic_sum, AdamWL2Optimizer, [(-5.0, 5.0)] * 3, True, None,
+                               optimizer_kwargs={'gradient_type': 'stochastic', **kwargs}, sinks=[])
+
+
+@pytest.mark.parametrize('antithetic, probes', [(True, 2 * 4), (False, 4 + 1)])
+def test_spsa_evaluations_per_round(antithetic, probes):
+    process = make_process(directions=4, antithetic=antithetic)
+    process.optimize(5)
+
+    # Все пробы шага уходят в оценщик одним пакетом
+    assert process.metrics.counters['evaluations'] == 5 * probes
+    assert process.metrics.counters['batches'] == 5
+    assert process.solutions_pool.count == 5 * probes
+    process.close()
+
+
+def test_spsa_converges_on_quadratic():
+    process = make_process(directions=4)
+    process.optimizer.restart(np.full(3, 3.0))
+    process.optimize(500)
+
+    assert process.find_best().function_value < 0.05
+    assert vector_quadratic_sum(process.optimizer.space.from_unit(process.optimizer.x)) < 0.05
+    process.close()
@@ -0,0 +1,51 @@
+import json
+import os
+
+import numpy as np
+
+from base import SolutionPool
+from storage.log import SolutionLog
+
+
+def write_rows(log: SolutionLog, start: int, count: int, dimension: int = 2):
+    values = np.arange(start, start + count, dtype=float)
+    vectors = np.repeat(values[:, None], dimension, axis=1)
+    log.append(vectors, values, np.zeros(count), np.zeros(count, dtype=np.int32), ['test'])
+
+
+def test_log_recovers_after_torn_index_and_keeps_appending(tmp_path):
+    path = str(tmp_path / 'log')
+    log = SolutionLog(path, chunk_size=10, flush_interval=1e9)
+    write_rows(log, 0, 30)
+    log.close()
+    assert log.rows == 30
+
+    # Падение посреди записи строки индекса
+    index_path = os.path.join(path, SolutionLog.INDEX_FILE)
+    with open(index_path, 'a') as file:
+        file.write(json.dumps({'file': 'chunk_000003.npy', 'rows': 10, 'dimension': 2,
+                               'source_names': ['test']})[:25])
+
+    log = SolutionLog(path, chunk_size=10, flush_interval=1e9)
+    assert log.rows == 30
+    write_rows(log, 30, 20)
+    log.close()
+
+    pool = SolutionPool.from_log(path)
+    np.testing.assert_array_equal(pool.values, np.arange(50, dtype=float))
+    np.testing.assert_array_equal(pool.vectors[:, 1], np.arange(50, dtype=float))
+    assert pool.source_names == ['test']
+
+
+def test_log_skips_entry_without_chunk_file(tmp_path):
+    path = str(tmp_path / 'log')
+    log = SolutionLog(path, chunk_size=10, flush_interval=1e9)
+    write_rows(log, 0, 10)
+    write_rows(log, 10, 10)
+    log.close()
+    assert len(log.entries) == 2
+
+    os.remove(os.path.join(path, 'chunk_000001.npy'))
+
+    pool = SolutionPool.from_log(path)
+    np.testing.assert_array_equal(pool.values, np.arange(10, dtype=float))
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from plotters.line import minmax_downsample
+
+
+@pytest.mark.parametrize('count', [10, 2000, 2001, 12345])
+def test_minmax_downsample_keeps_endpoints_and_extremes(count):
+    values = np.random.default_rng(count).normal(size=count)
+    indices, sampled = minmax_downsample(values, 2000)
+
+    np.testing.assert_array_equal(sampled, values[indices])
+    assert np.all(np.diff(indices) > 0)
+    assert indices[0] == 0 and indices[-1] == count - 1
+    assert sampled.min() == values.min() and sampled.max() == values.max()
+    assert len(indices) <= 2000 + 4
+
+
+def test_minmax_downsample_keeps_best_of_history():
+    # История минимума пула монотонна, лучшее значение - последняя точка
+    values = np.minimum.accumulate(np.random.default_rng(0).normal(size=50000))
+    indices, sampled = minmax_downsample(values, 100)
+    assert sampled[-1] == values.min() and indices[-1] == len(values) - 1
+    assert sampled[0] == values[0]
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from base import Solution, SolutionPool, SolutionStream
+
+
+def fill(pool: SolutionPool, values: np.ndarray, dimension: int = 3):
+    # Вперемешку пакеты разного размера и одиночные решения
+    vectors = np.arange(len(values) * dimension, dtype=float).reshape(len(values), dimension)
+    position = 0
+    for size in (1, 7, 1, 50, 3, 200):
+        stop = min(position + size, len(values))
+        if size == 1 and stop > position:
+            pool.add_solution(Solution(vectors[position], float(values[position]), source='single'))
+        elif stop > position:
+            pool.add_solutions(vectors[position:stop], values[position:stop], 'batch')
+        position = stop
+    if position < len(values):
+        pool.add_solutions(vectors[position:], values[position:], 'batch')
+    return vectors
+
+
+@pytest.mark.parametrize('minimization', [True, False])
+def test_incremental_statistics_match_history(minimization):
+    values = np.random.default_rng(0).normal(size=300)
+    pool = SolutionPool(top_k_size=8, minimization=minimization, capacity=4)
+    vectors = fill(pool, values)
+
+    assert pool.count == len(values)
+    np.testing.assert_array_equal(pool.values, values)
+    np.testing.assert_array_equal(pool.vectors, vectors)
+
+    assert pool.mean == pytest.approx(values.mean())
+    assert pool.variance == pytest.approx(values.var(ddof=1))
+
+    np.testing.assert_array_equal(pool.min_history, np.minimum.accumulate(values))
+    np.testing.assert_array_equal(pool.max_history, np.maximum.accumulate(values))
+
+    best = values.min() if minimization else values.max()
+    assert pool.best_value == best
+    assert pool.best_solution().function_value == best
+
+
+@pytest.mark.parametrize('minimization', [True, False])
+def test_top_k_matches_sorted_history(minimization):
+    values = np.random.default_rng(1).normal(size=300)
+    pool = SolutionPool(top_k_size=8, minimization=minimization)
+    fill(pool, values)
+
+    expected = np.sort(values) if minimization else np.sort(values)[::-1]
+    for k in (1, 5, 8):
+        assert [solution.function_value for solution in pool.top_k(k)] == list(expected[:k])
+    # Больше, чем держит куча, - через сортировку истории
+    assert [solution.function_value for solution in pool.top_k(20)] == list(expected[:20])
+
+
+@pytest.mark.parametrize('minimization', [True, False])
+def test_nan_values_are_skipped(minimization):
+    # NaN - потеря при сбое решателя (--nan-on-solver-error)
+    values = np.array([np.nan, 1.0, 0.5, np.nan, 2.0, np.nan])
+    pool = SolutionPool(top_k_size=2, minimization=minimization)
+    pool.add_solutions(np.zeros((3, 2)), values[:3], 'batch')
+    pool.add_solution(Solution(np.zeros(2), float(values[3])))
+    pool.add_solutions(np.zeros((2, 2)), values[4:], 'batch')
+
+    finite = values[~np.isnan(values)]
+    best = finite.min() if minimization else finite.max()
+    assert pool.best_value == best
+    assert pool.best_solution().function_value == best
+    assert pool.mean == pytest.approx(finite.mean())
+    assert pool.variance == pytest.approx(finite.var(ddof=1))
+
+    np.testing.assert_array_equal(pool.min_history, [np.nan, 1.0, 0.5, 0.5, 0.5, 0.5])
+    np.testing.assert_array_equal(pool.max_history, [np.nan, 1.0, 1.0, 1.0, 2.0, 2.0])
+
+    expected = np.sort(finite) if minimization else np.sort(finite)[::-1]
+    assert [solution.function_value for solution in pool.top_k(2)] == list(expected[:2])
+    assert [solution.function_value for solution in pool.top_k(5)] == list(expected)
+
+
+def test_solution_stream_skips_nan():
+    stream = SolutionStream(minimization=True)
+    stream.add_solutions(np.zeros((2, 2)), [np.nan, np.nan])
+    assert stream.best_value is None and stream.count == 2
+    stream.add_solutions(np.ones((3, 2)), [np.nan, 3.0, 2.0])
+    assert stream.best_value == 2.0 and stream.count == 5
+
+
+def test_empty_batch_is_ignored():
+    pool = SolutionPool()
+    assert pool.add_solutions([], []) is False
+    assert pool.count == 0 and pool.best_value is None
+
+    pool.add_solutions(np.ones((2, 3)), [2.0, 1.0])
+    assert pool.add_solutions(np.zeros((0, 3)), []) is False
+    assert pool.count == 2 and pool.best_value == 1.0
+
+
+def test_solution_vector_survives_pool_growth():
+    pool = SolutionPool(capacity=1)
+    vector = np.array([1.0, 2.0])
+    solution = Solution(vector, 1.0)
+    pool.add_solution(solution)
+    vector[:] = 0.0
+    pool.add_solutions(np.full((10, 2), 5.0), np.arange(10.0))
+
+    np.testing.assert_array_equal(solution.vector, [1.0, 2.0])
+    assert solution.vector.base is None
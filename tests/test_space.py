@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from space import Bound, ParameterSpace, repair
+
+
+def test_repair_modes():
+    low, high = np.array([0.0, -1.0]), np.array([1.0, 1.0])
+    vectors = np.array([[-0.2, 1.5],
+                        [1.3, -3.5],
+                        [0.5, 0.0],
+                        [2.0, 5.0]])
+
+    np.testing.assert_allclose(repair(vectors, low, high, 'clip'),
+                               [[0.0, 1.0], [1.0, -1.0], [0.5, 0.0], [1.0, 1.0]])
+    np.testing.assert_allclose(repair(vectors, low, high, 'reflect'),
+                               [[0.2, 0.5], [0.7, 0.5], [0.5, 0.0], [0.0, 1.0]])
+    np.testing.assert_allclose(repair(vectors, low, high, 'wrap'),
+                               [[0.8, -0.5], [0.3, 0.5], [0.5, 0.0], [0.0, -1.0]])
+
+    with pytest.raises(ValueError):
+        repair(vectors, low, high, 'bounce')
+
+
+@pytest.mark.parametrize('mode', ['clip', 'reflect', 'wrap'])
+def test_repair_keeps_points_inside(mode):
+    space = ParameterSpace([(-2.0, 3.0), (1e-3, 1e2)], mode)
+    vectors = np.random.default_rng(0).normal(scale=50.0, size=(1000, 2))
+    assert space.contains(space.repair(vectors)).all()
+    assert space.contains(space.from_unit(space.repair_unit(vectors))).all()
+
+    # Точки внутри и на границах не меняются (кроме high при wrap: это та же точка, что low)
+    inside = np.array([[-2.0, 1e-3], [0.5, 7.0], [3.0, 1e2]])
+    expected = inside if mode != 'wrap' else np.array([[-2.0, 1e-3], [0.5, 7.0], [-2.0, 1e-3]])
+    np.testing.assert_allclose(space.repair(inside), expected)
+
+
+def test_unit_round_trip_with_log_scale():
+    space = ParameterSpace([Bound(-5.0, 5.0), Bound(1e-3, 1e1, 'log'), Bound(0.1, 1.0)])
+    vectors = space.sample(500)
+    assert space.contains(vectors).all()
+
+    units = space.to_unit(vectors)
+    assert ((units >= 0) & (units <= 1)).all()
+    np.testing.assert_allclose(space.from_unit(units), vectors)
+    np.testing.assert_allclose(space.to_unit(space.from_unit(units)), units)
+
+    np.testing.assert_allclose(space.to_unit(space.low), 0.0, atol=1e-12)
+    np.testing.assert_allclose(space.to_unit(space.high), 1.0)
+    # Середина куба для логарифмического параметра - среднее геометрическое границ
+    np.testing.assert_allclose(space.from_unit([0.5, 0.5, 0.5]), [0.0, 0.1, 0.55])
+
+
+def test_unit_jacobian_matches_finite_differences():
+    space = ParameterSpace([Bound(-5.0, 5.0), Bound(1e-3, 1e1, 'log')])
+    units = np.array([0.3, 0.7])
+    step = 1e-6
+    numeric = [(space.from_unit(units + step * e) - space.from_unit(units - step * e))[i] / (2 * step)
+               for i, e in enumerate(np.eye(2))]
+    np.testing.assert_allclose(space.unit_jacobian(units), numeric, rtol=1e-6)
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        Bound(1.0, 1.0)
+    with pytest.raises(ValueError):
+        Bound(0.0, 1.0, 'log')
+    with pytest.raises(ValueError):
+        Bound(0.0, 1.0, 'sqrt')
+
+
+def test_from_bounds():
+    space = ParameterSpace([(0.0, 1.0)], 'reflect')
+    assert ParameterSpace.from_bounds(space) is space
+    assert ParameterSpace.from_bounds(space, 'wrap').repair_mode == 'wrap'
+    assert ParameterSpace.from_bounds([(0.0, 1.0)]).repair_mode == 'clip'
+    assert ParameterSpace.from_bounds([Bound(0.0, 1.0)]).tuples() == [(0.0, 1.0)]
@@ -0,0 +1,64 @@
+import numpy as np
+
+from optimizers.swarm import SwarmOptimizer
+from process import OptimizationProcess
+from stopping import EvaluationBudget, NoImprovement, TargetValue, WallClock
+from target.test import vector_quadratic_sum
+
+
+def constant(vector):
+    return 1.0
+
+
+def make_process(target=vector_quadratic_sum) -> OptimizationProcess:
+    np.random.seed(0)
+    return OptimizationProcess(target, SwarmOptimizer, [(-5.0, 5.0)] * 3, True, None,
+                               optimizer_kwargs={'swarm_size': 10}, sinks=[])
+
+
+def test_runs_all_rounds_without_rule():
+    process = make_process()
+    assert process.optimize(4) == 'rounds: 4 done'
+    assert process.optimizer.rounds_done == 4
+    process.close()
+
+
+def test_evaluation_budget():
+    process = make_process()
+    reason = process.optimize(1000, EvaluationBudget(35))
+    # Проверка после раунда: останавливаемся на первом раунде, исчерпавшем бюджет
+    assert reason.startswith('evaluation budget')
+    assert process.optimizer.rounds_done == 4
+    assert process.stop_reason == reason
+    process.close()
+
+
+def test_target_value():
+    process = make_process()
+    reason = process.optimize(1000, TargetValue(1e9))
+    assert reason.startswith('target value reached')
+    assert process.optimizer.rounds_done == 1
+    process.close()
+
+
+def test_no_improvement():
+    process = make_process(constant)
+    reason = process.optimize(1000, NoImprovement(window=3) | WallClock(60))
+    assert reason.startswith('no improvement')
+    assert process.optimizer.rounds_done == 4
+    process.close()
+
+
+def test_wall_clock():
+    process = make_process()
+    assert process.optimize(1000, WallClock(0)).startswith('wall clock')
+    assert process.optimizer.rounds_done == 1
+    process.close()
+
+
+def test_rule_is_removed_after_run():
+    process = make_process()
+    process.optimize(1000, TargetValue(1e9))
+    assert process.optimize(3) == 'rounds: 3 done'
+    assert process.optimizer.rounds_done == 4
+    process.close()
@@ -0,0 +1,28 @@
+import numpy as np
+
+from optimizers.swarm import SwarmOptimizer
+from process import OptimizationProcess
+from target.test import vector_quadratic_sum
+
+
+def test_each_round_is_one_batch():
+    batch_sizes = []
+
+    def batch_target(matrix):
+        batch_sizes.append(len(matrix))
+        return np.sum(matrix * matrix, axis=1)
+
+    np.random.seed(0)
+    process = OptimizationProcess(vector_quadratic_sum, SwarmOptimizer, [(-5.0, 5.0)] * 3, True, None,
+                                  batch_target=batch_target, optimizer_kwargs={'swarm_size': 12}, sinks=[])
+    process.optimize(4)
+
+    assert batch_sizes == [12] * 4
+    assert process.metrics.counters['evaluations'] == 12 * 4
+    assert process.metrics.counters['batches'] == 4
+    assert process.solutions_pool.count == 12 * 4
+
+    # Лучшее личное значение частицы - минимум её истории
+    history = process.solutions_pool.values.reshape(4, 12)
+    np.testing.assert_allclose(process.optimizer.personal_best_scores, history.min(axis=0))
+    process.close()